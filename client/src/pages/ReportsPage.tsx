@@ -21,7 +21,7 @@ interface MoodReport {
   }>;
   detected_moods: string[];
   statistics: {
-    average_message_length: number;
+    average_message_length?: number | null;  // absent on reports written by bulk_reports.py
     negative_percentage: number;
     neutral_percentage: number;
   };
@@ -358,7 +358,11 @@ const ReportsPage: React.FC = () => {
                       </div>
                       <div className="flex items-center justify-between">
                         <span>Avg. Message Length</span>
-                        <span className="font-medium">{selectedReport.statistics.average_message_length} chars</span>
+                        <span className="font-medium">
+                          {selectedReport.statistics.average_message_length != null
+                            ? `${selectedReport.statistics.average_message_length} chars`
+                            : 'N/A'}
+                        </span>
                       </div>
                       <div className="flex items-center justify-between">
                         <span>Average Mood</span>
@@ -1,105 +1,528 @@
+"""Synthetic TalkWell workload generator.
+
+Models a population of users, each with their own activity level, message
+volume, baseline mood mix, day-to-day mood persistence and questionnaire
+cadence, and streams their chat messages and questionnaires day by day.
+Memory use only grows with the number of users, never with the number of
+rows, so multi-million-row corpora are fine:
+
+    # 10k users over 180 days as JSONL (or .csv), ~5M rows
+    python generate_test_data.py generate --users 10000 --days 180 --out workload.jsonl
+
+    # replay a corpus against a running server
+    python generate_test_data.py replay workload.jsonl --api http://localhost:5000 --concurrency 16
+
+    # write a corpus straight into Mongo (DB_BACKEND/MONGODB_URI/MOOD_STORAGE as
+    # for the server), then run the bulk report job on it; with DB_BACKEND=memory
+    # the data only lives for this run, so use --reports to measure something
+    python generate_test_data.py seed workload.jsonl --reports
+
+    # test_data/*.json for metrics_analysis.py, measured against a running server
+    python generate_test_data.py metrics --api http://localhost:5000 --samples 200
+
+`generate` writes to stdout when --out is omitted, and every other command
+reads `-` as stdin, so corpora can be piped without touching disk.
+"""
+import argparse
+import csv
+import functools
 import json
+import math
+import os
+import queue
 import random
-from datetime import datetime
+import sys
+import threading
 import time
+import urllib.error
+import urllib.request
+import zlib
+from datetime import date, datetime, timedelta
+
+MOODS = ['happy', 'neutral', 'tired', 'anxious', 'sad']
+DEFAULT_MOOD_MIX = {'happy': 0.3, 'neutral': 0.25, 'tired': 0.15, 'anxious': 0.2, 'sad': 0.1}
+# Mean and spread of the 1-5 mood score a message in that mood gets
+MOOD_SCORES = {'happy': (4.2, 0.5), 'neutral': (2.6, 0.4), 'tired': (1.8, 0.4), 'anxious': (1.7, 0.5), 'sad': (1.5, 0.5)}
+# Sentiment the message text expresses; chat scores are drawn inside its band so both agree
+MOOD_SENTIMENT = {'happy': 'positive', 'neutral': 'neutral', 'tired': 'negative', 'anxious': 'negative',
+                  'sad': 'negative'}
+SENTIMENT_BANDS = {'positive': (3.01, 5.0), 'neutral': (2.0, 3.0), 'negative': (1.0, 1.99)}
+
+OPENERS = {
+    'happy': ["I feel great", "I'm so happy", "Today was a really good day", "I'm excited", "I feel amazing",
+              "I'm proud of myself", "Things are going well"],
+    'neutral': ["Today was okay", "Nothing special happened", "I'm fine I guess", "Just a normal day",
+                "I had lunch and did some reading", "Not much to report"],
+    'tired': ["I'm exhausted", "I can barely keep my eyes open", "I feel so drained", "I didn't sleep much",
+              "I'm worn out", "I have no energy"],
+    'anxious': ["I'm really worried", "I feel anxious", "I'm stressed", "I'm nervous", "I can't stop overthinking",
+                "I'm panicking a bit"],
+    'sad': ["I feel sad", "I'm really down", "I feel lonely", "I've been crying", "Everything feels heavy",
+            "I feel hopeless"]
+}
+TOPICS = {
+    'happy': ["after hanging out with my friends", "because I passed my exam", "since the weather is lovely",
+              "after a long walk", "because my project worked"],
+    'neutral': ["at school", "at work", "this afternoon", "so far", "today"],
+    'tired': ["after studying all night", "from all these deadlines", "after a long shift", "this week",
+              "because of my late classes"],
+    'anxious': ["about my exam tomorrow", "about my grades", "about the deadline", "about my presentation",
+                "about what my parents will say"],
+    'sad': ["since my friend moved away", "after the argument", "about my results", "for no clear reason",
+            "because nobody texted me"]
+}
+CLOSERS = ["", "", "", "What should I do?", "Any advice?", "I just wanted to tell someone.", "Is that normal?"]
+QUESTION_COUNT = 10
+
+CSV_FIELDS = ['type', 'user_id', 'timestamp', 'mood', 'sentiment', 'score', 'total_score', 'message', 'answers',
+              'idempotency_key']
+
+
+def sentiment_label(score):
+    # Same thresholds as the server's mood distributions
+    return 'positive' if score > 3 else 'negative' if score < 2 else 'neutral'
+
+
+def chat_score(rng, mood):
+    """Normal draw around the mood's mean, redrawn until it falls in its sentiment band."""
+    low, high = SENTIMENT_BANDS[MOOD_SENTIMENT[mood]]
+    mean, spread = MOOD_SCORES[mood]
+    for _ in range(20):
+        score = round(rng.gauss(mean, spread), 2)
+        if low <= score <= high:
+            return score
+    return round(min(high, max(low, mean)), 2)
+
+
+def poisson(rng, lam):
+    if lam > 30:
+        return max(0, int(round(rng.gauss(lam, math.sqrt(lam)))))
+    threshold, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= threshold:
+            return k
+        k += 1
+
+
+class UserModel:
+    """Per-user behaviour drawn once from the population parameters."""
+
+    def __init__(self, user_id, rng, args, mood_mix):
+        self.user_id = user_id
+        self.active_rate = min(1.0, rng.betavariate(2, 2) * 2 * args.active_rate)
+        self.messages_per_day = rng.lognormvariate(math.log(args.messages_per_day), 0.6)
+        self.questionnaire_rate = 1 / max(1.0, rng.expovariate(1 / args.questionnaire_every))
+        self.persistence = args.persistence
+        # Dirichlet draw around the population mix: every user leans somewhere else
+        weights = [rng.gammavariate(mood_mix[m] * args.mood_concentration, 1) + 1e-9 for m in MOODS]
+        total = sum(weights)
+        self.mood_weights = [w / total for w in weights]
+        self.mood = rng.choices(MOODS, self.mood_weights)[0]
+        self.sequence = 0
+
+    def next_day(self, rng, day):
+        if rng.random() > self.persistence:
+            self.mood = rng.choices(MOODS, self.mood_weights)[0]
+        if day.weekday() >= 5 and self.mood != 'happy' and rng.random() < 0.1:
+            self.mood = 'happy'  # weekends are a little lighter
+        return rng.random() < self.active_rate
+
+
+def message_text(rng, mood):
+    text = f"{rng.choice(OPENERS[mood])} {rng.choice(TOPICS[mood])}."
+    closer = rng.choice(CLOSERS)
+    return f"{text} {closer}" if closer else text
+
+
+def event_time(rng, day):
+    # Most conversations happen in the evening
+    hour = rng.triangular(7, 24, 20)
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+
+
+def generate_events(args):
+    """Yields workload rows in day order; memory is O(users)."""
+    rng = random.Random(args.seed)
+    mood_mix = parse_mood_mix(args.mood_mix)
+    users = [UserModel(f"{args.user_prefix}{i}", rng, args, mood_mix) for i in range(args.users)]
+    start = date.fromisoformat(args.start_date) if args.start_date else date.today() - timedelta(days=args.days - 1)
+
+    for offset in range(args.days):
+        day = start + timedelta(days=offset)
+        for user in users:
+            if not user.next_day(rng, day):
+                continue
+            day_events = []
+            for _ in range(max(1, poisson(rng, user.messages_per_day))):
+                mood = user.mood if rng.random() < 0.75 else rng.choices(MOODS, user.mood_weights)[0]
+                day_events.append({
+                    'type': 'chat',
+                    'user_id': user.user_id,
+                    'timestamp': event_time(rng, day),
+                    'mood': mood,
+                    'sentiment': MOOD_SENTIMENT[mood],
+                    'score': chat_score(rng, mood),
+                    'message': message_text(rng, mood)
+                })
+            if rng.random() < user.questionnaire_rate:
+                mean, spread = MOOD_SCORES[user.mood]
+                answers = {
+                    f"q{i + 1}": int(min(5, max(1, round(rng.gauss(mean, spread + 0.4)))))
+                    for i in range(QUESTION_COUNT)
+                }
+                total = sum(answers.values())
+                user.sequence += 1
+                day_events.append({
+                    'type': 'questionnaire',
+                    'user_id': user.user_id,
+                    'timestamp': event_time(rng, day),
+                    'mood': user.mood,
+                    'sentiment': sentiment_label(total / QUESTION_COUNT),
+                    'score': total / QUESTION_COUNT,
+                    'total_score': total,
+                    'answers': answers,
+                    'idempotency_key': f"{user.user_id}-q{user.sequence}"
+                })
+            day_events.sort(key=lambda event: event['timestamp'])
+            for event in day_events:
+                event['timestamp'] = event['timestamp'].isoformat(timespec='seconds')
+                yield event
+
+
+def parse_mood_mix(text):
+    if not text:
+        return DEFAULT_MOOD_MIX
+    mix = dict(DEFAULT_MOOD_MIX, **{k: float(v) for k, v in (pair.split('=') for pair in text.split(','))})
+    unknown = set(mix) - set(MOODS)
+    if unknown:
+        raise SystemExit(f"Unknown moods in --mood-mix: {sorted(unknown)}, expected {MOODS}")
+    total = sum(mix.values())
+    return {mood: mix[mood] / total for mood in MOODS}
+
+
+# --- Corpus files ---
+
+def write_events(events, out, fmt):
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for event in events:
+            row = dict(event)
+            if 'answers' in row:
+                row['answers'] = json.dumps(row['answers'], separators=(',', ':'))
+            writer.writerow(row)
+            count += 1
+    else:
+        for event in events:
+            out.write(json.dumps(event, separators=(',', ':')))
+            out.write('\n')
+            count += 1
+    return count
+
+
+def read_events(path):
+    """Streams rows back from a JSONL or CSV corpus ('-' reads JSONL from stdin)."""
+    f = sys.stdin if path == '-' else open(path, newline='')
+    try:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                row['score'] = float(row['score'])
+                if row['type'] == 'questionnaire':
+                    row['total_score'] = int(row['total_score'])
+                    row['answers'] = json.loads(row['answers'])
+                yield {k: v for k, v in row.items() if v != ''}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def output_format(path, fmt):
+    return fmt or ('csv' if path and path.endswith('.csv') else 'jsonl')
+
+
+# --- Replay against the API ---
+
+def post_json(url, payload, timeout):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
 
-def generate_sentiment_test_data():
-    """Generate test data for sentiment analysis"""
-    sentiments = ['positive', 'negative', 'neutral']
-    test_cases = [
-        "I'm feeling great today!",
-        "This is the worst day ever.",
-        "The weather is okay.",
-        "I love this new feature!",
-        "I'm really disappointed with the service.",
-        "It's just another regular day.",
-        "This makes me so happy!",
-        "I can't believe how terrible this is.",
-        "The results are as expected.",
-        "I'm thrilled with the outcome!"
-    ]
-    
-    results = []
-    for text in test_cases:
-        # Simulate API call
-        time.sleep(0.1)  # Simulate response time
-        start_time = time.time()
-        
-        # Simulate prediction (in real scenario, this would be your actual model)
-        predicted = random.choice(sentiments)
-        
-        # Determine actual sentiment (simplified for example)
-        actual = 'positive' if 'great' in text.lower() or 'love' in text.lower() or 'happy' in text.lower() or 'thrilled' in text.lower() else \
-                'negative' if 'worst' in text.lower() or 'disappointed' in text.lower() or 'terrible' in text.lower() else 'neutral'
-        
-        results.append({
-            'text': text,
-            'predicted_sentiment': predicted,
-            'actual_sentiment': actual,
-            'response_time': time.time() - start_time,
+def get_json(url, timeout):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+class LatencyStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+
+    def add(self, endpoint, status, seconds):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            key = (endpoint, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def report(self, elapsed):
+        for endpoint, values in sorted(self.latencies.items()):
+            values.sort()
+            pct = lambda p: values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+            statuses = ', '.join(f"{status}: {n}" for (name, status), n in sorted(self.statuses.items())
+                                 if name == endpoint)
+            print(f"{endpoint:28} {len(values):8d} req  {len(values) / elapsed:8.1f} req/s  "
+                  f"p50 {pct(50):8.1f} ms  p95 {pct(95):8.1f} ms  p99 {pct(99):8.1f} ms  ({statuses})")
+
+
+def replay_request(event):
+    """(endpoint, body) that replays one corpus row."""
+    if event['type'] == 'chat':
+        return '/api/chat', {'user_id': event['user_id'], 'message': event['message']}
+    # The bulk endpoint keeps the questionnaire's original date
+    return '/api/mood/questionnaire/bulk', {
+        'user_id': event['user_id'],
+        'submissions': [{
+            'idempotency_key': event['idempotency_key'],
+            'total_score': event['total_score'],
+            'answers': event['answers'],
+            'created_at': event['timestamp']
+        }]
+    }
+
+
+def replay(args):
+    """Sends the corpus with `concurrency` simulated clients.
+
+    Each user is pinned to one client, so like a real person their messages
+    go out in order and never overlap (and never trip the per-user limits).
+    """
+    api = args.api.rstrip('/')
+    stats = LatencyStats()
+    users = set()
+    interval = 1 / args.rate if args.rate else 0
+    # Bounded per-client queues keep memory flat on huge corpora
+    queues = [queue.Queue(maxsize=1000) for _ in range(args.concurrency)]
+
+    def client(jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            endpoint, send = job
+            started = time.perf_counter()
+            try:
+                status, _ = send()
+            except (urllib.error.URLError, OSError) as e:
+                status = type(e).__name__
+            stats.add(endpoint, status, time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client, args=(jobs,), daemon=True) for jobs in queues]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    for i, event in enumerate(read_events(args.corpus)):
+        if args.limit and i >= args.limit:
+            break
+        if interval:
+            delay = started + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if len(users) < args.read_users:
+            users.add(event['user_id'])
+        shard = zlib.crc32(event['user_id'].encode('utf-8')) % len(queues)
+        endpoint, body = replay_request(event)
+        queues[shard].put((endpoint, functools.partial(post_json, f"{api}{endpoint}", body, args.timeout)))
+
+    # Then the views the dashboard polls, for a sample of the replayed users
+    for user_id in sorted(users):
+        shard = zlib.crc32(user_id.encode('utf-8')) % len(queues)
+        for path in (f"/api/chat/report/{user_id}", f"/api/mood/reports/{user_id}",
+                     f"/api/mood/calendar/{user_id}", f"/api/mood/daily/{user_id}"):
+            queues[shard].put((
+                path.rsplit('/', 1)[0] + '/<user_id>', functools.partial(get_json, f"{api}{path}", args.timeout)
+            ))
+
+    for jobs in queues:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+    stats.report(time.perf_counter() - started)
+
+
+# --- Seeding Mongo ---
+
+def seed(args):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+    from backends import create_mongo_client
+    from mood_store import build_questionnaire, create_mood_storage, ensure_indexes, observation, submit_questionnaires
+
+    db = create_mongo_client()[args.database]
+    storage = create_mood_storage(db)
+    storage.ensure_schema()
+    questionnaires = db['mood_questionnaire']
+    ensure_indexes(questionnaires)
+
+    started = time.perf_counter()
+    counts = {'chat': 0, 'questionnaire': 0, 'duplicate': 0}
+    observations, documents = [], []
+
+    def flush():
+        storage.record(observations)
+        # Questionnaires keep their idempotency keys, so re-seeding skips (and doesn't re-score) stored ones
+        created, duplicates, _ = submit_questionnaires(questionnaires, storage, documents)
+        counts['chat'] += len(observations)
+        counts['questionnaire'] += len(created)
+        counts['duplicate'] += len(duplicates)
+        observations.clear()
+        documents.clear()
+
+    for event in read_events(args.corpus):
+        timestamp = datetime.fromisoformat(event['timestamp'])
+        if event['type'] == 'chat':
+            observations.append(observation(event['user_id'], timestamp, event['score'], 'chat', [event['mood']]))
+        else:
+            documents.append(build_questionnaire(dict(event, created_at=event['timestamp']), now=timestamp))
+        if len(observations) + len(documents) >= args.batch_size:
+            flush()
+    flush()
+    seconds = time.perf_counter() - started
+    print(f"Seeded {counts['chat']} chat scores and {counts['questionnaire']} questionnaires "
+          f"({counts['duplicate']} already stored) into {args.database} ({storage.name} storage) in {seconds:.1f}s")
+
+    if args.reports:
+        from bulk_reports import generate_reports
+        summary = generate_reports(db)
+        print(f"Generated reports for {summary['users']} users in {summary['seconds']}s")
+
+
+# --- metrics_analysis.py inputs ---
+
+def metrics(args):
+    """Writes test_data/{sentiment,mood}_test_results.json from live API calls on generated messages."""
+    api = args.api.rstrip('/')
+    events = (event for event in generate_events(args) if event['type'] == 'chat')
+    sentiment_results, mood_results = [], []
+    for event in events:
+        if len(mood_results) >= args.samples:
+            break
+        started = time.perf_counter()
+        _, body = post_json(f"{api}/api/chat", {'user_id': event['user_id'], 'message': event['message']},
+                            args.timeout)
+        sentiment_results.append({
+            'text': event['message'],
+            'predicted_sentiment': (body or {}).get('sentiment', {}).get('mood', 'error'),
+            'actual_sentiment': event['sentiment'],
+            'response_time': time.perf_counter() - started,
             'timestamp': datetime.now().isoformat()
         })
-    
-    return results
-
-def generate_mood_test_data():
-    """Generate test data for mood detection"""
-    moods = ['happy', 'sad', 'angry', 'anxious', 'calm']
-    test_cases = [
-        "I'm feeling joyful and energetic today!",
-        "I'm really down and can't seem to shake it.",
-        "I'm so frustrated with this situation!",
-        "I'm worried about what might happen next.",
-        "I feel peaceful and content right now.",
-        "Everything is going great!",
-        "I'm feeling really low today.",
-        "This is making me so angry!",
-        "I'm feeling nervous about the presentation.",
-        "I'm in a good mood today."
-    ]
-    
-    results = []
-    for text in test_cases:
-        # Simulate API call
-        time.sleep(0.1)  # Simulate response time
-        start_time = time.time()
-        
-        # Simulate prediction (in real scenario, this would be your actual model)
-        predicted = random.choice(moods)
-        
-        # Determine actual mood (simplified for example)
-        actual = 'happy' if 'joyful' in text.lower() or 'great' in text.lower() or 'good' in text.lower() else \
-                'sad' if 'down' in text.lower() or 'low' in text.lower() else \
-                'angry' if 'frustrated' in text.lower() or 'angry' in text.lower() else \
-                'anxious' if 'worried' in text.lower() or 'nervous' in text.lower() else 'calm'
-        
-        results.append({
-            'text': text,
-            'predicted_mood': predicted,
-            'actual_mood': actual,
-            'response_time': time.time() - start_time,
+        started = time.perf_counter()
+        _, body = post_json(f"{api}/api/mood/predict", {'message': event['message']}, args.timeout)
+        mood_results.append({
+            'text': event['message'],
+            'predicted_mood': (body or {}).get('predicted_mood', 'error'),
+            'actual_mood': event['mood'],
+            'response_time': time.perf_counter() - started,
             'timestamp': datetime.now().isoformat()
         })
-    
-    return results
 
-def main():
-    # Create test data directory if it doesn't exist
-    import os
     os.makedirs('test_data', exist_ok=True)
-    
-    # Generate test data
-    sentiment_data = generate_sentiment_test_data()
-    mood_data = generate_mood_test_data()
-    
-    # Save test data
     with open('test_data/sentiment_test_results.json', 'w') as f:
-        json.dump(sentiment_data, f, indent=2)
-    
+        json.dump(sentiment_results, f, indent=2)
     with open('test_data/mood_test_results.json', 'w') as f:
-        json.dump(mood_data, f, indent=2)
-    
-    print("Test data generated successfully!")
+        json.dump(mood_results, f, indent=2)
+    print(f"Wrote {len(mood_results)} samples to test_data/")
+
+
+# --- CLI ---
+
+def add_population_args(parser):
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--start-date', help="first day, YYYY-MM-DD (default: so the last day is today)")
+    parser.add_argument('--messages-per-day', type=float, default=4.0, help="median messages on an active day")
+    parser.add_argument('--active-rate', type=float, default=0.5, help="mean share of days a user chats")
+    parser.add_argument('--questionnaire-every', type=float, default=7.0, help="mean days between questionnaires")
+    parser.add_argument('--persistence', type=float, default=0.6, help="chance a mood carries over to the next day")
+    parser.add_argument('--mood-mix', help="population mood mix, e.g. happy=0.4,sad=0.1 (others keep defaults)")
+    parser.add_argument('--mood-concentration', type=float, default=5.0,
+                        help="how closely users follow the population mix (lower = more varied users)")
+    parser.add_argument('--user-prefix', default='user_')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and replay synthetic TalkWell workloads")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="stream a workload corpus as JSONL or CSV")
+    add_population_args(generate)
+    generate.add_argument('--out', help="output file (default: stdout)")
+    generate.add_argument('--format', choices=['jsonl', 'csv'], help="default: from the --out extension")
+
+    replay_parser = commands.add_parser('replay', help="send a corpus to a running server")
+    replay_parser.add_argument('corpus')
+    replay_parser.add_argument('--api', default='http://localhost:5000')
+    replay_parser.add_argument('--concurrency', type=int, default=8)
+    replay_parser.add_argument('--rate', type=float, default=0, help="requests per second (default: unthrottled)")
+    replay_parser.add_argument('--limit', type=int, default=0, help="stop after this many rows")
+    replay_parser.add_argument('--read-users', type=int, default=50,
+                               help="users whose report, calendar and daily views are fetched afterwards")
+    replay_parser.add_argument('--timeout', type=float, default=60)
+
+    seed_parser = commands.add_parser(
+        'seed', help="write a corpus straight into the mood collections (chat scores are appended on every run)"
+    )
+    seed_parser.add_argument('corpus')
+    seed_parser.add_argument('--database', default='wellness_ai')
+    seed_parser.add_argument('--batch-size', type=int, default=10000)
+    seed_parser.add_argument('--reports', action='store_true', help="run bulk_reports.py on the seeded data")
+
+    metrics_parser = commands.add_parser('metrics', help="write test_data/ for metrics_analysis.py")
+    add_population_args(metrics_parser)
+    metrics_parser.add_argument('--api', default='http://localhost:5000')
+    metrics_parser.add_argument('--samples', type=int, default=100)
+    metrics_parser.add_argument('--timeout', type=float, default=60)
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'generate':
+            started = time.perf_counter()
+            out = open(args.out, 'w', newline='') if args.out else sys.stdout
+            try:
+                count = write_events(generate_events(args), out, output_format(args.out, args.format))
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            seconds = time.perf_counter() - started
+            print(f"Generated {count} rows in {seconds:.1f}s ({count / max(seconds, 1e-9):.0f} rows/s)",
+                  file=sys.stderr)
+        elif args.command == 'replay':
+            replay(args)
+        elif args.command == 'seed':
+            seed(args)
+        else:
+            metrics(args)
+    except BrokenPipeError:
+        # The reader went away (`generate | head`); point stdout at devnull so the exit flush stays quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
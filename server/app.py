@@ -1,94 +1,120 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-from langchain_groq import ChatGroq
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import Chroma
-from langchain.chains import RetrievalQA
+from langchain.chains.question_answering import load_qa_chain
 from langchain.prompts import PromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from textblob import TextBlob
+from backends import create_llm, create_mongo_client
+from model_server import (ModelClient, ModelComponents, RemoteChatHistory, RemoteConversationMemory,
+                          RemoteRetrievalStage, RemoteUserSlots, RemoteUserVersions, sentiment_polarity)
+from trends import TrendStore
+from mood_store import (MAX_BATCH_SIZE, build_questionnaire, create_mood_storage, ensure_indexes, observation,
+                        submit_questionnaires)
+from mood_classifier import MoodClassifier, keyword_mood
+from profiling import SamplingProfiler
+from response_cache import ResponseCache
+from scheduler import Scheduler
+from serialization import json_response
 import os
-import json
 from datetime import datetime
-from pymongo import MongoClient
-from bson import ObjectId
 
 app = Flask(__name__)
 CORS(app)
+
+# Initialize the LLM (LLM_BACKEND=fake for offline runs)
+llm = create_llm()
+
+print("Initializing Chatbot...")
+serving_mode = os.getenv('SERVING_MODE', 'standalone')
+
+if serving_mode == 'worker':
+    # Embeddings, retrieval, TextBlob and the per-user state live once in the model server
+    # (see model_server.py), so any gunicorn worker can serve any user
+    model_client = ModelClient.from_env()
+    retrieval_stage = RemoteRetrievalStage(model_client)
+    polarity = model_client.polarity
+    chat_history = RemoteChatHistory(model_client)
+    conversation_memory = RemoteConversationMemory(model_client)
+    cache_versions = RemoteUserVersions(model_client)
+    scheduler_slots = RemoteUserSlots(model_client)
+else:
+    components = ModelComponents(llm)
+    retrieval_stage = components.retrieval_stage
+    polarity = sentiment_polarity
+    # Chat history and sentiment analysis of every user
+    chat_history = components.chat_history
+    conversation_memory = components.conversation_memory
+    cache_versions = components.versions
+    scheduler_slots = components.slots
+
+# Chat and report generation run on their own bounded pools (see scheduler.py)
+scheduler = Scheduler.from_env(slots=scheduler_slots)
+# Opt-in request profiling (PROFILE_SAMPLE_RATE / PROFILE_TOKEN, see profiling.py)
+profiler = SamplingProfiler.from_env()
+# Trained mood classifier (python mood_classifier.py train). Predictions below its held-out
+# min_confidence (or MOOD_MODEL_MIN_CONFIDENCE) use the keyword rules, as does a missing model
+mood_model_path = os.getenv('MOOD_MODEL_PATH', 'mood_model.bin')
+mood_classifier = MoodClassifier.load(mood_model_path) if os.path.exists(mood_model_path) else None
+if mood_classifier and os.getenv('MOOD_MODEL_MIN_CONFIDENCE'):
+    mood_classifier.min_confidence = float(os.getenv('MOOD_MODEL_MIN_CONFIDENCE'))
+
 @app.route('/api/mood/predict', methods=['POST'])
 def predict_mood():
     data = request.get_json()
+    # Batch inference: {"messages": [...]} -> {"predicted_moods": [...]}
+    if 'messages' in data:
+        messages = [str(m) for m in data.get('messages') or []]
+        if mood_classifier:
+            moods = mood_classifier.predict(messages)
+        else:
+            moods = [keyword_mood(m) for m in messages]
+        return jsonify({"predicted_moods": moods})
+
     message = data.get('message', '')
-    # Replace this with your real mood detection logic
-    if "happy" in message:
-        mood = "happy"
-    elif "sad" in message:
-        mood = "sad"
-    elif "tired" in message:
-        mood = "tired"
-    elif "anxious" in message or "worried" in message:
-        mood = "anxious"
+    if mood_classifier:
+        mood = mood_classifier.predict_one(message)
     else:
-        mood = "neutral"
+        mood = keyword_mood(message)
     return jsonify({"predicted_mood": mood})
 
 # MongoDB connection
-client = MongoClient("cluster_name")
+client = create_mongo_client()
 db = client['wellness_ai']
-mood_collection = db['mood_tracking']
+mood_storage = create_mood_storage(db)  # MOOD_STORAGE=daily (mood_tracking) | timeseries (mood_observations)
 mood_report_collection = db['mood_reports']  # New collection for mood reports
 mood_questionnaire_collection = db['mood_questionnaire']
-
-# Initialize the LLM
-llm = ChatGroq(
-    temperature=0.7,  # Increased for more friendly responses
-    groq_api_key=os.getenv('GROQ_API_KEY'),
-    model_name="llama-3.3-70b-versatile"
+trend_store = TrendStore(mood_storage)
+# Serialized responses of the polled read endpoints, invalidated per user on every write
+response_cache = ResponseCache(
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', 30)),
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 10000)),
+    versions=cache_versions
 )
 
-# Initialize vector database
-def create_vector_db():
-    loader = PyPDFLoader("mental_health_Document.pdf")
-    documents = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    texts = text_splitter.split_documents(documents)
-    embeddings = HuggingFaceBgeEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')
-    vector_db = Chroma.from_documents(texts, embeddings, persist_directory='./chroma_db')
-    vector_db.persist()
-    return vector_db
-
-def setup_qa_chain(vector_db, llm):
-    retriever = vector_db.as_retriever()
+try:
+    ensure_indexes(mood_questionnaire_collection)
+    mood_storage.ensure_schema()
+except Exception as e:
+    print(f"Error creating mood indexes: {str(e)}")
+
+def setup_qa_chain(llm):
     prompt_templates = """You are a friendly and supportive mental health companion. Keep your responses brief (2-3 sentences) and warm, like a caring friend. Use the following context to help inform your response:
 
     {context}
-    User: {question}
+    {history}User: {question}
     Chatbot: """
-    PROMPT = PromptTemplate(template=prompt_templates, input_variables=['context', 'question'])
-
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        chain_type_kwargs={"prompt": PROMPT}
-    )
-    return qa_chain
-
-# Initialize the chatbot
-print("Initializing Chatbot...")
-db_path = "./chroma_db"
+    PROMPT = PromptTemplate(template=prompt_templates, input_variables=['context', 'history', 'question'])
 
-if not os.path.exists(db_path):
-    vector_db = create_vector_db()
-else:
-    embeddings = HuggingFaceBgeEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')
-    vector_db = Chroma(persist_directory=db_path, embedding_function=embeddings)
+    # The retrieval stage picks the documents, so only the "stuff" step is needed here
+    qa_chain = load_qa_chain(llm=llm, chain_type="stuff", prompt=PROMPT)
+    return qa_chain
 
-qa_chain = setup_qa_chain(vector_db, llm)
+def generate_response(user_id, message):
+    docs = retrieval_stage.retrieve(message)
+    history = conversation_memory.build_context(user_id)
+    response = qa_chain.run(input_documents=docs, question=message, history=history)
+    conversation_memory.add_turn(user_id, message, response)
+    return response
 
-# Store chat history and sentiment analysis
-chat_history = {}
+qa_chain = setup_qa_chain(llm)
 
 def analyze_sentiment(text):
     try:
@@ -151,8 +177,7 @@ def analyze_sentiment(text):
         }
         
         # Get base sentiment from TextBlob
-        analysis = TextBlob(text)
-        base_sentiment = analysis.sentiment.polarity
+        base_sentiment = polarity(text)
         
         # Check for specific mood categories
         detected_moods = []
@@ -216,6 +241,8 @@ def analyze_sentiment(text):
         }
 
 @app.route('/api/chat', methods=['POST'])
+@scheduler.scheduled('chat', user=lambda: (request.get_json(silent=True) or {}).get('user_id', 'default_user'))
+@profiler.profiled
 def chat():
     data = request.json
     message = data.get('message', '')
@@ -225,15 +252,11 @@ def chat():
         return jsonify({'error': 'No message provided'}), 400
     
     try:
-        response = qa_chain.run(message)
+        response = generate_response(user_id, message)
         
         # Analyze sentiment of user's message
         sentiment = analyze_sentiment(message)
         
-        # Initialize chat history for new users
-        if user_id not in chat_history:
-            chat_history[user_id] = []
-        
         # Store chat history with sentiment
         chat_entry = {
             'message': message,
@@ -241,61 +264,16 @@ def chat():
             'sentiment': sentiment,
             'timestamp': datetime.now().isoformat()
         }
-        chat_history[user_id].append(chat_entry)
-        
-        # Get today's date
-        today = datetime.now().date().isoformat()
+        chat_history.append(user_id, chat_entry)
         
-        # Update or create daily mood summary
-        daily_mood = mood_collection.find_one({
-            'user_id': user_id,
-            'date': today
-        })
-        
-        if daily_mood:
-            # Update existing daily mood
-            mood_scores = daily_mood.get('mood_scores', []) + [sentiment['score']]
-            detected_moods = list(set(daily_mood.get('detected_moods', []) + sentiment['detected_moods']))
-            
-            # Calculate new averages
-            avg_score = sum(mood_scores) / len(mood_scores)
-            mood_counts = {
-                'positive': len([s for s in mood_scores if s > 3]),
-                'neutral': len([s for s in mood_scores if 2 <= s <= 3]),
-                'negative': len([s for s in mood_scores if s < 2])
-            }
-            primary_mood = max(mood_counts.items(), key=lambda x: x[1])[0]
-            
-            mood_collection.update_one(
-                {'_id': daily_mood['_id']},
-                {
-                    '$set': {
-                        'mood_score': round(avg_score, 2),
-                        'primary_mood': primary_mood,
-                        'detected_moods': detected_moods,
-                        'mood_scores': mood_scores,
-                        'mood_distribution': mood_counts,
-                        'last_updated': datetime.now()
-                    }
-                }
-            )
-        else:
-            # Create new daily mood entry
-            mood_collection.insert_one({
-                'user_id': user_id,
-                'date': today,
-                'mood_score': sentiment['score'],
-                'primary_mood': sentiment['primary_mood'],
-                'detected_moods': sentiment['detected_moods'],
-                'mood_scores': [sentiment['score']],
-                'mood_distribution': {
-                    'positive': 1 if sentiment['score'] > 3 else 0,
-                    'neutral': 1 if 2 <= sentiment['score'] <= 3 else 0,
-                    'negative': 1 if sentiment['score'] < 2 else 0
-                },
-                'created_at': datetime.now(),
-                'last_updated': datetime.now()
-            })
+        # Append the score to today's mood data (one atomic write, see mood_store.py)
+        now = datetime.now()
+        today = now.date().isoformat()
+        mood_storage.record(
+            [observation(user_id, now, sentiment['score'], 'chat', sentiment['detected_moods'])], now
+        )
+        trend_store.record(user_id, today, sentiment['score'])
+        response_cache.bump(user_id)
         
         return jsonify({
             'response': response,
@@ -305,14 +283,42 @@ def chat():
         print(f"Error processing message: {str(e)}")
         return jsonify({'error': 'Error processing message'}), 500
 
+@app.route('/api/retrieval/stats', methods=['GET'])
+def get_retrieval_stats():
+    # Context token counts before (default top-4 stuffing) and after the retrieval stage
+    return jsonify(retrieval_stage.stats())
+
+@app.route('/api/scheduler/stats', methods=['GET'])
+def get_scheduler_stats():
+    # Queue depths, wait/run time percentiles and rejection counts per endpoint class
+    return jsonify(scheduler.stats())
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not profiler.authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(profiler.list_captures())
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    if not profiler.authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    path = profiler.capture_path(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    # Collapsed stacks: render with flamegraph.pl, speedscope or inferno
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=f"{name}.collapsed")
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
 @app.route('/api/mood/daily/<user_id>', methods=['GET'])
+@response_cache.cached
 def get_daily_mood(user_id):
     try:
         today = datetime.now().date().isoformat()
-        daily_mood = mood_collection.find_one({
-            'user_id': user_id,
-            'date': today
-        })
+        daily_mood = mood_storage.daily_summary(user_id, today)
         
         if not daily_mood:
             return jsonify({
@@ -323,22 +329,30 @@ def get_daily_mood(user_id):
                 'mood_distribution': {'positive': 0, 'neutral': 0, 'negative': 0}
             })
         
-        # Convert ObjectId to string for JSON serialization
-        daily_mood['_id'] = str(daily_mood['_id'])
-        daily_mood['created_at'] = daily_mood['created_at'].isoformat()
-        daily_mood['last_updated'] = daily_mood['last_updated'].isoformat()
-        
-        return jsonify(daily_mood)
+        return json_response(daily_mood)
     except Exception as e:
         print(f"Error fetching daily mood: {str(e)}")
         return jsonify({'error': 'Error fetching daily mood'}), 500
 
+@app.route('/api/mood/trends/<user_id>', methods=['GET'])
+def get_mood_trends(user_id):
+    try:
+        days = min(max(request.args.get('days', 30, type=int), 1), 365)
+        ema_span = min(max(request.args.get('ema_span', 7, type=int), 1), 90)
+        return json_response(trend_store.trends(str(user_id), days=days, ema_span=ema_span))
+    except Exception as e:
+        print(f"Error fetching mood trends: {str(e)}")
+        return jsonify({'error': f'Error fetching mood trends: {str(e)}'}), 500
+
 @app.route('/api/chat/report/<user_id>', methods=['GET'])
+@scheduler.scheduled('report', user=lambda: request.view_args['user_id'])
+@profiler.profiled
 def get_chat_report(user_id):
     # Convert user_id to string to ensure consistent handling
     user_id = str(user_id)
+    entries = chat_history.get(user_id)
     
-    if user_id not in chat_history:
+    if not entries:
         return jsonify({
             'chat_history': [],
             'average_sentiment': 0,
@@ -355,7 +369,7 @@ def get_chat_report(user_id):
         })
     
     # Calculate average sentiment
-    sentiments = [entry['sentiment']['score'] for entry in chat_history[user_id]]
+    sentiments = [entry['sentiment']['score'] for entry in entries]
     avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0
     
     # Get mood distribution
@@ -366,14 +380,14 @@ def get_chat_report(user_id):
     }
     
     # Calculate additional statistics
-    total_messages = len(chat_history[user_id])
+    total_messages = len(entries)
     positive_percentage = (mood_counts['positive'] / total_messages * 100) if total_messages > 0 else 0
     negative_percentage = (mood_counts['negative'] / total_messages * 100) if total_messages > 0 else 0
     neutral_percentage = 100 - positive_percentage - negative_percentage
     
     # Prepare time series data for trend graph
     time_series_data = []
-    for entry in chat_history[user_id]:
+    for entry in entries:
         timestamp = datetime.fromisoformat(entry['timestamp'])
         time_series_data.append({
             'timestamp': timestamp.isoformat(),
@@ -410,17 +424,18 @@ def get_chat_report(user_id):
         },
         'mood_trend': daily_trend,
         'detected_moods': list(set(
-            mood for entry in chat_history[user_id]
+            mood for entry in entries
             for mood in entry['sentiment']['detected_moods']
         )),
         'statistics': {
             'average_message_length': round(
-                sum(len(entry['message']) for entry in chat_history[user_id]) / total_messages, 1
+                sum(len(entry['message']) for entry in entries) / total_messages, 1
             ) if total_messages > 0 else 0,
             'negative_percentage': round(negative_percentage, 1),
             'neutral_percentage': round(neutral_percentage, 1)
         },
-        'last_updated': datetime.now()
+        'last_updated': datetime.now(),
+        'generated_by': 'chat_report'
     }
 
     # Check if a report already exists for today
@@ -442,6 +457,7 @@ def get_chat_report(user_id):
             essential_report['created_at'] = datetime.now()
             mood_report_collection.insert_one(essential_report)
             print(f"Created new mood report for user {user_id}")
+        response_cache.bump(user_id)
     except Exception as e:
         print(f"Error storing mood report: {str(e)}")
 
@@ -454,7 +470,7 @@ def get_chat_report(user_id):
                 'sentiment': entry['sentiment'],
                 'timestamp': entry['timestamp']
             }
-            for entry in chat_history[user_id]
+            for entry in entries
         ],
         'average_sentiment': round(avg_sentiment, 2),
         'mood_distribution': mood_counts,
@@ -463,7 +479,7 @@ def get_chat_report(user_id):
             'positive_percentage': round(positive_percentage, 1),
             'negative_percentage': round(negative_percentage, 1),
             'average_message_length': round(
-                sum(len(entry['message']) for entry in chat_history[user_id]) / total_messages, 1
+                sum(len(entry['message']) for entry in entries) / total_messages, 1
             ) if total_messages > 0 else 0,
             'most_common_mood': max(mood_counts.items(), key=lambda x: x[1])[0] if mood_counts else 'neutral'
         },
@@ -472,6 +488,7 @@ def get_chat_report(user_id):
     })
 
 @app.route('/api/mood/reports/<user_id>', methods=['GET'])
+@response_cache.cached
 def get_user_mood_reports(user_id):
     try:
         # Convert user_id to string for consistent handling
@@ -486,22 +503,24 @@ def get_user_mood_reports(user_id):
             print(f"No reports found for user {user_id}")
             return jsonify([])
         
-        # Convert ObjectId to string for JSON serialization and handle timestamps
-        for report in reports:
-            report['_id'] = str(report['_id'])
-            # Handle all possible timestamp fields
-            timestamp_fields = ['created_at', 'last_updated', 'timestamp']
-            for field in timestamp_fields:
-                if field in report and isinstance(report[field], datetime):
-                    report[field] = report[field].isoformat()
-        
         print(f"Successfully retrieved {len(reports)} reports for user {user_id}")
-        return jsonify(reports)
+        return json_response(reports)
     except Exception as e:
         print(f"Error fetching mood reports: {str(e)}")
         return jsonify({'error': f'Error fetching mood reports: {str(e)}'}), 500
 
+def calendar_entry(mood):
+    # Reports written before all fields existed get the calendar defaults
+    return {
+        **mood,
+        'primary_mood': mood.get('primary_mood', 'neutral'),
+        'average_mood': mood.get('average_mood', 3.0),
+        'mood_distribution': mood.get('mood_distribution', {'positive': 0, 'neutral': 0, 'negative': 0}),
+        'detected_moods': mood.get('detected_moods', [])
+    }
+
 @app.route('/api/mood/calendar/<user_id>', methods=['GET'])
+@response_cache.cached
 def get_mood_calendar(user_id):
     try:
         # Get the current month's moods
@@ -518,25 +537,8 @@ def get_mood_calendar(user_id):
             }
         }).sort('date', 1))
         
-        # Convert ObjectId to string for JSON serialization and format dates
-        for mood in moods:
-            mood['_id'] = str(mood['_id'])
-            # Include all relevant mood data
-            mood_data = {
-                'date': mood['date'],
-                'primary_mood': mood.get('primary_mood', 'neutral'),
-                'average_mood': mood.get('average_mood', 3.0),
-                'mood_distribution': mood.get('mood_distribution', {
-                    'positive': 0,
-                    'neutral': 0,
-                    'negative': 0
-                }),
-                'detected_moods': mood.get('detected_moods', [])
-            }
-            mood.update(mood_data)
-        
-        return jsonify({
-            'moods': moods,
+        return json_response({
+            'moods': [calendar_entry(mood) for mood in moods],
             'month': today.month,
             'year': today.year
         })
@@ -545,6 +547,7 @@ def get_mood_calendar(user_id):
         return jsonify({'error': f'Error fetching mood calendar: {str(e)}'}), 500
 
 @app.route('/api/mood/calendar/<user_id>/<int:year>/<int:month>', methods=['GET'])
+@response_cache.cached
 def get_mood_calendar_by_month(user_id, year, month):
     try:
         # Get moods for the specified month
@@ -560,25 +563,8 @@ def get_mood_calendar_by_month(user_id, year, month):
             }
         }).sort('date', 1))
         
-        # Convert ObjectId to string for JSON serialization and format dates
-        for mood in moods:
-            mood['_id'] = str(mood['_id'])
-            # Include all relevant mood data
-            mood_data = {
-                'date': mood['date'],
-                'primary_mood': mood.get('primary_mood', 'neutral'),
-                'average_mood': mood.get('average_mood', 3.0),
-                'mood_distribution': mood.get('mood_distribution', {
-                    'positive': 0,
-                    'neutral': 0,
-                    'negative': 0
-                }),
-                'detected_moods': mood.get('detected_moods', [])
-            }
-            mood.update(mood_data)
-        
-        return jsonify({
-            'moods': moods,
+        return json_response({
+            'moods': [calendar_entry(mood) for mood in moods],
             'month': month,
             'year': year
         })
@@ -590,105 +576,89 @@ def get_mood_calendar_by_month(user_id, year, month):
 def submit_questionnaire():
     try:
         data = request.json
-        user_id = str(data.get('user_id'))
-        answers = data.get('answers', {})
-        total_score = data.get('total_score', 0)
+        if not data.get('idempotency_key') and request.headers.get('Idempotency-Key'):
+            data['idempotency_key'] = request.headers['Idempotency-Key']
+        data.pop('created_at', None)  # single submissions are always stamped with the server time
         now = datetime.now()
-        today_str = now.date().isoformat()
 
-        # Calculate mood based on score
-        mood = 'positive' if total_score >= 40 else 'neutral' if total_score >= 30 else 'negative'
-
-        # Store questionnaire data with the correct current date and time
-        questionnaire_data = {
-            'user_id': user_id,
-            'date': today_str,
-            'total_score': total_score,
-            'answers': answers,
-            'mood': mood,
-            'created_at': now
-        }
-
-        result = mood_questionnaire_collection.insert_one(questionnaire_data)
-        questionnaire_data['_id'] = str(result.inserted_id)
-        questionnaire_data['created_at'] = now.isoformat()
-
-        # Also update the daily mood summary
-        daily_mood = mood_collection.find_one({
-            'user_id': user_id,
-            'date': today_str
-        })
-
-        if daily_mood:
-            # Update existing daily mood
-            mood_scores = daily_mood.get('mood_scores', []) + [total_score / 10]  # Convert to 1-5 scale
-            detected_moods = list(set(daily_mood.get('detected_moods', []) + [mood]))
-
-            # Calculate new averages
-            avg_score = sum(mood_scores) / len(mood_scores)
-            mood_counts = {
-                'positive': len([s for s in mood_scores if s > 3]),
-                'neutral': len([s for s in mood_scores if 2 <= s <= 3]),
-                'negative': len([s for s in mood_scores if s < 2])
-            }
-            primary_mood = max(mood_counts.items(), key=lambda x: x[1])[0]
-
-            mood_collection.update_one(
-                {'_id': daily_mood['_id']},
-                {
-                    '$set': {
-                        'mood_score': round(avg_score, 2),
-                        'primary_mood': primary_mood,
-                        'detected_moods': detected_moods,
-                        'mood_scores': mood_scores,
-                        'mood_distribution': mood_counts,
-                        'last_updated': now
-                    }
-                }
-            )
-        else:
-            # Create new daily mood entry
-            mood_collection.insert_one({
-                'user_id': user_id,
-                'date': today_str,
-                'mood_score': total_score / 10,  # Convert to 1-5 scale
-                'primary_mood': mood,
-                'detected_moods': [mood],
-                'mood_scores': [total_score / 10],
-                'mood_distribution': {
-                    'positive': 1 if total_score >= 40 else 0,
-                    'neutral': 1 if 30 <= total_score < 40 else 0,
-                    'negative': 1 if total_score < 30 else 0
-                },
-                'created_at': now,
-                'last_updated': now
-            })
+        questionnaire_data = build_questionnaire(data, now=now)
+        created, duplicates, applied = submit_questionnaires(
+            mood_questionnaire_collection, mood_storage, [questionnaire_data], now
+        )
+        for doc in applied:
+            trend_store.record(doc['user_id'], doc['date'], doc['total_score'] / 10)
+            response_cache.bump(doc['user_id'])
 
         # Return the full new entry so the frontend can display it immediately
-        return jsonify({
+        if duplicates:
+            return json_response({
+                'success': True,
+                'message': 'Questionnaire already submitted',
+                'data': duplicates[0]
+            })
+        return json_response({
             'success': True,
             'message': 'Questionnaire submitted successfully',
-            'data': questionnaire_data
+            'data': created[0]
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error submitting questionnaire: {str(e)}")
         return jsonify({'error': f'Error submitting questionnaire: {str(e)}'}), 500
 
+@app.route('/api/mood/questionnaire/bulk', methods=['POST'])
+def submit_questionnaire_bulk():
+    """Syncs a batch of (possibly backlogged) questionnaires.
+
+    Body: {"user_id": ..., "submissions": [{"idempotency_key", "answers", "total_score", "created_at"}, ...]}
+    Submissions whose idempotency key was already stored are reported as duplicates.
+    """
+    try:
+        data = request.json or {}
+        submissions = data.get('submissions') or []
+        if len(submissions) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} submissions per request'}), 400
+
+        now = datetime.now()
+        documents = []
+        errors = []
+        for i, submission in enumerate(submissions):
+            try:
+                documents.append(build_questionnaire(submission, data.get('user_id'), now))
+            except (ValueError, TypeError) as e:
+                errors.append({'index': i, 'error': str(e)})
+        if errors:
+            return jsonify({'error': 'Invalid submissions', 'details': errors}), 400
+
+        created, duplicates, applied = submit_questionnaires(
+            mood_questionnaire_collection, mood_storage, documents, now
+        )
+        for doc in applied:
+            trend_store.record(doc['user_id'], doc['date'], doc['total_score'] / 10)
+            response_cache.bump(doc['user_id'])
+
+        return json_response({
+            'success': True,
+            'created': len(created),
+            'duplicates': len(duplicates),
+            'data': created,
+            'duplicate_data': duplicates
+        })
+    except Exception as e:
+        print(f"Error submitting questionnaires: {str(e)}")
+        return jsonify({'error': f'Error submitting questionnaires: {str(e)}'}), 500
+
 @app.route('/api/mood/questionnaire/<user_id>', methods=['GET'])
+@response_cache.cached
 def get_questionnaire_history(user_id):
     try:
         # Get all questionnaire entries for the user, sorted by date
         entries = list(mood_questionnaire_collection.find(
-            {'user_id': user_id}
+            {'user_id': user_id}, {'mood_pending_since': 0}
         ).sort('date', -1))
         
-        # Convert ObjectId to string for JSON serialization
-        for entry in entries:
-            entry['_id'] = str(entry['_id'])
-            if 'created_at' in entry:
-                entry['created_at'] = entry['created_at'].isoformat()
-        
-        return jsonify(entries)
+        return json_response(entries)
     except Exception as e:
         print(f"Error fetching questionnaire history: {str(e)}")
         return jsonify({'error': f'Error fetching questionnaire history: {str(e)}'}), 500
@@ -0,0 +1,216 @@
+"""Backend registry for the LLM, the embedding model and the Mongo client.
+
+Backends are picked by name from the environment:
+
+    LLM_BACKEND        groq (default) | fake
+    EMBEDDING_BACKEND  huggingface (default) | hashing
+    DB_BACKEND         mongo (default) | memory
+
+The `fake`, `hashing` and `memory` backends need no network, so the whole
+chat path can be exercised and benchmarked on an offline machine.
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from langchain_core.pydantic_v1 import PrivateAttr
+
+LLM_BACKENDS = {}
+EMBEDDING_BACKENDS = {}
+DB_BACKENDS = {}
+
+
+def register(registry, name):
+    def decorator(factory):
+        registry[name] = factory
+        return factory
+    return decorator
+
+
+def _create(registry, kind, name):
+    if name not in registry:
+        raise ValueError(f"Unknown {kind} backend '{name}', expected one of {sorted(registry)}")
+    return registry[name]()
+
+
+def create_llm(name=None):
+    return _create(LLM_BACKENDS, 'LLM', name or os.getenv('LLM_BACKEND', 'groq'))
+
+
+def embedding_backend_name():
+    return os.getenv('EMBEDDING_BACKEND', 'huggingface')
+
+
+def create_embeddings(name=None):
+    return _create(EMBEDDING_BACKENDS, 'embedding', name or embedding_backend_name())
+
+
+def create_mongo_client(name=None):
+    return _create(DB_BACKENDS, 'database', name or os.getenv('DB_BACKEND', 'mongo'))
+
+
+# --- LLM backends ---
+
+@register(LLM_BACKENDS, 'groq')
+def groq_llm():
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        temperature=0.7,  # Increased for more friendly responses
+        groq_api_key=os.getenv('GROQ_API_KEY'),
+        model_name="llama-3.3-70b-versatile"
+    )
+
+
+@register(LLM_BACKENDS, 'fake')
+def fake_llm():
+    return FakeLLM(
+        latency=float(os.getenv('FAKE_LLM_LATENCY', 0.0)),
+        token_latency=float(os.getenv('FAKE_LLM_TOKEN_LATENCY', 0.0)),
+        error_rate=float(os.getenv('FAKE_LLM_ERROR_RATE', 0.0)),
+        seed=int(os.getenv('FAKE_LLM_SEED', 0))
+    )
+
+
+class FakeLLMError(RuntimeError):
+    """Injected failure standing in for a provider error or timeout."""
+
+
+FAKE_RESPONSES = [
+    "That sounds like a lot to carry right now. Try taking a few slow breaths, and remember it's okay to take things one step at a time.",
+    "I'm really glad you shared that with me. Would it help to talk through what's been on your mind the most today?",
+    "It makes sense that you feel this way. A short walk or a small break can sometimes give your mind some room to rest.",
+    "That's wonderful to hear! Hold on to that feeling and notice what helped you get there.",
+    "Exams can feel overwhelming, but breaking your study time into small, focused blocks often makes it more manageable.",
+    "You don't have to figure everything out at once. Being kind to yourself today is already a good step."
+]
+
+
+class FakeLLM(LLM):
+    """Deterministic offline LLM with configurable latency, streaming and error injection.
+
+    The reply depends only on the prompt, so runs are reproducible. `latency`
+    is paid once per call, `token_latency` once per streamed token, and
+    `error_rate` is the probability that a call raises FakeLLMError.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+    _rng: Any = PrivateAttr()
+    _rng_lock: Any = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake'
+
+    def _reply(self, prompt):
+        digest = hashlib.blake2b(f"{self.seed}:{prompt}".encode('utf-8'), digest_size=8).digest()
+        return FAKE_RESPONSES[int.from_bytes(digest, 'little') % len(FAKE_RESPONSES)]
+
+    def _start(self):
+        with self._rng_lock:
+            failed = self._rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            raise FakeLLMError("Injected fake LLM failure")
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return ''.join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        self._start()
+        for token in re.findall(r"\S+\s*", self._reply(prompt)):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+
+
+# --- Embedding backends ---
+
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+@register(EMBEDDING_BACKENDS, 'huggingface')
+def huggingface_embeddings():
+    from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+    return HuggingFaceBgeEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+
+@register(EMBEDDING_BACKENDS, 'hashing')
+def hashing_embeddings():
+    return HashingEmbeddings(dimension=int(os.getenv('HASHING_EMBEDDING_DIM', 384)))
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed bag of words and bigrams, L2 normalized.
+
+    Uses the same dimension as MiniLM by default so it can be dropped in
+    without rebuilding the vector store schema.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        words = re.findall(r"[a-z0-9']+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in features:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            vector[digest % self.dimension] += 1.0 if (digest >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# --- Database backends ---
+
+@register(DB_BACKENDS, 'mongo')
+def mongo_client():
+    from pymongo import MongoClient
+    return MongoClient(os.getenv('MONGODB_URI', 'cluster_name'))
+
+
+@register(DB_BACKENDS, 'memory')
+def memory_client():
+    # In-process stand-in for offline runs, needs mongomock (requirements_bench.txt)
+    import mongomock
+    return mongomock.MongoClient()
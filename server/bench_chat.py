@@ -0,0 +1,88 @@
+"""Offline /api/chat benchmark.
+
+Runs the real Flask app against the fake LLM, the hashing embedder and the
+in-memory Mongo stand-in, so throughput, caching and concurrency behaviour
+can be measured reproducibly without network access:
+
+    pip install -r requirements_bench.txt
+    python bench_chat.py --requests 500 --concurrency 8 --llm-latency 0.2
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_MESSAGES = [
+    "I'm so stressed about my exams next week",
+    "I had a really good day with my friends",
+    "I can't sleep and I feel exhausted",
+    "I'm worried I'm going to fail my test",
+    "I feel a bit down today",
+    "How can I manage exam stress?",
+    "Everything feels overwhelming right now",
+    "I'm feeling calm and relaxed after my walk"
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark /api/chat with offline backends")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="seconds per LLM call")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="seconds per streamed token")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of LLM calls that fail")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('EMBEDDING_BACKEND', 'hashing')
+    os.environ.setdefault('DB_BACKEND', 'memory')
+    os.environ.setdefault('CHROMA_DB_PATH', './chroma_db_hashing')
+    os.environ.setdefault('CHUNK_STORE_PATH', './chunk_store_hashing.bin')
+    os.environ['FAKE_LLM_LATENCY'] = str(args.llm_latency)
+    os.environ['FAKE_LLM_TOKEN_LATENCY'] = str(args.token_latency)
+    os.environ['FAKE_LLM_ERROR_RATE'] = str(args.error_rate)
+    os.environ['FAKE_LLM_SEED'] = str(args.seed)
+
+    from app import app, retrieval_stage
+
+    rng = random.Random(args.seed)
+    payloads = [
+        {'message': rng.choice(SAMPLE_MESSAGES), 'user_id': f"bench_user_{rng.randrange(args.users)}"}
+        for _ in range(args.requests)
+    ]
+
+    def send(payload):
+        started = time.perf_counter()
+        with app.test_client() as test_client:
+            status = test_client.post('/api/chat', json=payload).status_code
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(send, payloads))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    errors = sum(1 for status, _ in results if status != 200)
+    print(f"Requests:     {len(results)} ({errors} errors) with concurrency {args.concurrency}")
+    print(f"Throughput:   {len(results) / elapsed:.1f} req/s")
+    print(f"Latency mean: {statistics.mean(latencies) * 1000:.1f} ms")
+    print(f"Latency p50:  {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Latency p95:  {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"Retrieval:    {retrieval_stage.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Write and range-read cost of the mood storage layouts as history grows.
+
+For each layout (MOOD_STORAGE=daily and timeseries) and history length, the
+benchmark database is filled with `--users` users x `days` days x `--per-day`
+scores, then it times:
+
+- write:   one chat observation for today (what /api/chat does per turn),
+- summary: today's daily summary for one user (/api/mood/daily),
+- history: every daily total of one user (the trend store load),
+- storage: collection storage size, when the server reports it.
+
+It runs against DB_BACKEND (in-memory mongomock by default, whose timings
+only show the shape; point MONGODB_URI at a real server for numbers). Only
+the `--database` database is touched and it is dropped afterwards:
+
+    DB_BACKEND=mongo python bench_mood_storage.py --days 30,365,1095 --per-day 8
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+MOODS = ['happy', 'anxious', 'sad', 'relaxed', 'overwhelmed']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the mood storage layouts")
+    parser.add_argument('--days', default='30,180,365', help="comma separated history lengths in days")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--per-day', type=int, default=6, help="scores per user and day")
+    parser.add_argument('--samples', type=int, default=200, help="timed operations per measurement")
+    parser.add_argument('--database', default='wellness_ai_bench')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def history(users, days, per_day, now, rng):
+    from mood_store import observation
+
+    first_day = datetime.combine(now.date(), datetime.min.time()) - timedelta(days=days)
+    for day in range(days):
+        for user in range(users):
+            for i in range(per_day):
+                yield observation(
+                    f"bench_user_{user}",
+                    first_day + timedelta(days=day, hours=8, minutes=i * 90 + rng.randrange(60)),
+                    round(rng.uniform(1, 5), 2),
+                    rng.choice(['chat', 'questionnaire']),
+                    rng.sample(MOODS, rng.randrange(0, 3))
+                )
+
+
+def timed(fn, samples):
+    durations = []
+    for i in range(samples):
+        started = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations) * 1000
+
+
+def storage_size(db, storage):
+    try:
+        return db.command('collStats', storage.collection.name).get('storageSize')
+    except Exception:
+        return None
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('DB_BACKEND', 'memory')
+
+    from backends import create_mongo_client
+    from mood_store import MOOD_STORAGES, observation
+
+    client = create_mongo_client()
+    db = client[args.database]
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    today = now.date().isoformat()
+
+    print(f"Backend {os.environ['DB_BACKEND']}, {args.users} users x {args.per_day} scores/day, "
+          f"median of {args.samples} operations")
+    print(f"{'layout':11} {'days':>5} {'observations':>12} {'write ms':>9} {'summary ms':>10} "
+          f"{'history ms':>10} {'storage MB':>10}")
+    try:
+        for days in [int(d) for d in args.days.split(',')]:
+            for name, storage_class in MOOD_STORAGES.items():
+                client.drop_database(args.database)
+                storage = storage_class(db)
+                storage.ensure_schema()
+
+                batch = []
+                total = 0
+                for obs in history(args.users, days, args.per_day, now, rng):
+                    batch.append(obs)
+                    if len(batch) >= 10000:
+                        storage.record(batch)
+                        total += len(batch)
+                        batch = []
+                storage.record(batch)
+                total += len(batch)
+
+                user = lambda i: f"bench_user_{i % args.users}"
+                write = timed(lambda i: storage.record(
+                    [observation(user(i), datetime.now(), round(rng.uniform(1, 5), 2), 'chat', ['happy'])]
+                ), args.samples)
+                summary = timed(lambda i: storage.daily_summary(user(i), today), args.samples)
+                scores = timed(lambda i: list(storage.daily_scores(user(i))), args.samples)
+                size = storage_size(db, storage)
+                size = f"{size / 1e6:10.1f}" if size is not None else f"{'n/a':>10}"
+                print(f"{name:11} {days:5d} {total:12d} {write:9.2f} {summary:10.2f} {scores:10.2f} {size}")
+    finally:
+        client.drop_database(args.database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Serialization throughput on representative `mood_reports` payloads.
+
+Compares the old route code (copy ObjectId/datetime fields to strings, then
+jsonify) with serialization.dumps, using orjson and the stdlib fallback:
+
+    python bench_serialization.py --reports 365 --rounds 200
+"""
+import argparse
+import copy
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask, jsonify
+
+import serialization
+
+MOODS = ['happy', 'anxious', 'sad', 'angry', 'relaxed', 'confused', 'overwhelmed']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of mood reports")
+    parser.add_argument('--reports', type=int, default=365, help="reports per response (one per day)")
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def make_reports(count, seed=0):
+    """Documents shaped like the ones get_chat_report stores, as PyMongo returns them."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9, 30)
+    reports = []
+    for i in range(count):
+        day = start + timedelta(days=i)
+        positive = round(rng.uniform(0, 100), 1)
+        negative = round(rng.uniform(0, 100 - positive), 1)
+        reports.append({
+            '_id': ObjectId(),
+            'user_id': 'bench_user',
+            'date': day.date().isoformat(),
+            'average_mood': round(rng.uniform(1, 5), 2),
+            'primary_mood': rng.choice(['positive', 'neutral', 'negative']),
+            'total_messages': rng.randrange(1, 60),
+            'mood_distribution': {
+                'positive': positive,
+                'neutral': round(100 - positive - negative, 1),
+                'negative': negative
+            },
+            'mood_trend': [
+                {'date': (day - timedelta(days=d)).date().isoformat(), 'average': rng.uniform(1, 5)}
+                for d in range(min(i, 14), -1, -1)
+            ],
+            'detected_moods': rng.sample(MOODS, rng.randrange(0, 4)),
+            'statistics': {
+                'average_message_length': round(rng.uniform(10, 200), 1),
+                'negative_percentage': negative,
+                'neutral_percentage': round(100 - positive - negative, 1)
+            },
+            'last_updated': day + timedelta(hours=12, microseconds=rng.randrange(1000000)),
+            'created_at': day
+        })
+    return reports
+
+
+def legacy_response(reports):
+    # What get_user_mood_reports did before
+    for report in reports:
+        report['_id'] = str(report['_id'])
+        for field in ['created_at', 'last_updated', 'timestamp']:
+            if field in report and isinstance(report[field], datetime):
+                report[field] = report[field].isoformat()
+    return jsonify(reports).get_data()
+
+
+def timed(fn, reports, rounds):
+    # Fresh documents per round, like a cursor returns, since the legacy loop mutates them
+    payloads = [copy.deepcopy(reports) for _ in range(rounds + 1)]
+    fn(payloads.pop())  # warm up
+    started = time.perf_counter()
+    for payload in payloads:
+        body = fn(payload)
+    return (time.perf_counter() - started) / rounds, len(body)
+
+
+def main():
+    args = parse_args()
+    reports = make_reports(args.reports, args.seed)
+    app = Flask(__name__)
+
+    candidates = [('legacy loop + jsonify', legacy_response)]
+    if serialization.orjson:
+        candidates.append(('dumps (orjson)', serialization.dumps))
+    candidates.append(('dumps (stdlib fallback)', serialization.dumps_stdlib))
+
+    # Every variant must produce the same JSON document
+    with app.app_context():
+        expected = json.loads(legacy_response(copy.deepcopy(reports)))
+    print(f"Payload: {args.reports} reports, {args.rounds} rounds")
+    baseline = None
+    for name, fn in candidates:
+        with app.app_context():
+            assert json.loads(fn(copy.deepcopy(reports))) == expected, name
+            seconds, size = timed(fn, reports, args.rounds)
+        baseline = baseline or seconds
+        print(f"{name:26} {seconds * 1000:8.2f} ms/response  "
+              f"{args.reports / seconds:10.0f} docs/s  {size / seconds / 1e6:7.1f} MB/s  "
+              f"x{baseline / seconds:.1f}")
+
+
+if __name__ == '__main__':
+    main()
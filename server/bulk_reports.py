@@ -0,0 +1,187 @@
+"""Bulk mood report job.
+
+Builds the same `mood_reports` documents as `/api/chat/report/<user_id>` for
+every user in one pass instead of one HTTP call per user:
+
+- daily scores are grouped by user and date inside Mongo (`$group` over the
+  configured mood storage, see mood_store.py) and streamed back in user order,
+- averages, distributions and trends are computed with pandas group-bys on
+  chunks of whole users,
+- each chunk is upserted into `mood_reports` with a single `bulk_write`.
+
+Like the endpoint, reports only cover chat messages: questionnaire scores
+recorded in the same mood storage are left out (`source` 'chat' in
+time-series mode, the `chat_scores` field in daily mode).
+
+In daily mode, days recorded before `chat_scores` existed have no chat-only
+data and are left out until `migrate_mood_timeseries.py --backfill-only`
+has run; the job reports how many such days it found.
+
+Reports are marked `generated_by: 'bulk_reports'`. A report the endpoint
+already wrote for the date is left alone, since it also has
+`statistics.average_message_length`, which needs the raw chat messages only
+the endpoint has (bulk reports don't set it); those users are counted as
+`skipped`.
+
+Usage:
+    python bulk_reports.py [--date YYYY-MM-DD] [--since YYYY-MM-DD] [--users id1,id2] [--dry-run]
+"""
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from mood_store import create_mood_storage
+
+MOOD_LABELS = np.array(['positive', 'neutral', 'negative'])
+
+
+def stream_user_chunks(mood_storage, user_ids=None, since=None, chunk_rows=50000):
+    """Yields lists of daily rows, never splitting one user's days across chunks."""
+    cursor = mood_storage.aggregate_daily_scores(user_ids, since, batch_size=min(chunk_rows, 10000))
+    chunk = []
+    for row in cursor:
+        user_id = row['_id']['user_id']
+        if len(chunk) >= chunk_rows and chunk[-1]['user_id'] != user_id:
+            yield chunk
+            chunk = []
+        chunk.append({
+            'user_id': user_id,
+            'date': row['_id']['date'],
+            'total': row['total'],
+            'count': row['count'],
+            'positive': row['positive'],
+            'negative': row['negative'],
+            'detected_moods': row['detected_moods']
+        })
+    if chunk:
+        yield chunk
+
+
+def build_reports(rows, report_date, now=None):
+    """Turns daily rows for a set of users into report documents, keyed by user id."""
+    now = now or datetime.now()
+    daily = pd.DataFrame.from_records(rows)
+    daily['average'] = daily['total'] / daily['count']
+
+    totals = daily.groupby('user_id', sort=False)[['total', 'count', 'positive', 'negative']].sum()
+    totals['neutral'] = totals['count'] - totals['positive'] - totals['negative']
+    count = totals['count'].to_numpy()
+    average = totals['total'].to_numpy() / count
+    positive_pct = totals['positive'].to_numpy() / count * 100
+    negative_pct = totals['negative'].to_numpy() / count * 100
+    neutral_pct = 100 - positive_pct - negative_pct
+    # argmax keeps the first maximum, matching max() over the positive/neutral/negative dict
+    primary = MOOD_LABELS[np.argmax(totals[['positive', 'neutral', 'negative']].to_numpy(), axis=1)]
+
+    trends = {}
+    moods = {}
+    for user_id, date, day_average, day_moods in zip(
+        daily['user_id'], daily['date'], daily['average'], daily['detected_moods']
+    ):
+        trends.setdefault(user_id, []).append({'date': date, 'average': float(day_average)})
+        user_moods = moods.setdefault(user_id, set())
+        for mood_list in day_moods:
+            user_moods.update(mood_list or [])
+
+    reports = {}
+    for i, user_id in enumerate(totals.index):
+        reports[user_id] = {
+            'user_id': user_id,
+            'date': report_date,
+            'average_mood': round(float(average[i]), 2),
+            'primary_mood': str(primary[i]),
+            'total_messages': int(count[i]),
+            'mood_distribution': {
+                'positive': round(float(positive_pct[i]), 1),
+                'neutral': round(float(neutral_pct[i]), 1),
+                'negative': round(float(negative_pct[i]), 1)
+            },
+            'mood_trend': trends[user_id],
+            'detected_moods': sorted(moods[user_id]),
+            'statistics.negative_percentage': round(float(negative_pct[i]), 1),
+            'statistics.neutral_percentage': round(float(neutral_pct[i]), 1),
+            'last_updated': now,
+            'generated_by': 'bulk_reports'
+        }
+    return reports
+
+
+def endpoint_written(mood_report_collection, user_ids, report_date):
+    """Users whose report for report_date was written by /api/chat/report."""
+    return {
+        doc['user_id']
+        for doc in mood_report_collection.find(
+            {'user_id': {'$in': list(user_ids)}, 'date': report_date, 'generated_by': {'$ne': 'bulk_reports'}},
+            {'user_id': 1}
+        )
+    }
+
+
+def report_upserts(reports, now):
+    return [
+        UpdateOne(
+            {'user_id': user_id, 'date': report['date']},
+            {
+                '$set': report,
+                '$setOnInsert': {'created_at': now}
+            },
+            upsert=True
+        )
+        for user_id, report in reports.items()
+    ]
+
+
+def generate_reports(db, report_date=None, user_ids=None, since=None, chunk_rows=50000, dry_run=False):
+    """Generates and stores today's mood report for every user with tracked chat moods."""
+    started = time.perf_counter()
+    report_date = report_date or datetime.now().date().isoformat()
+    mood_storage = create_mood_storage(db)
+    mood_report_collection = db['mood_reports']
+
+    summary = {'users': 0, 'upserted': 0, 'modified': 0, 'skipped': 0,
+               'days_without_chat_scores': mood_storage.days_without_chat_scores(user_ids, since)}
+    for rows in stream_user_chunks(mood_storage, user_ids, since, chunk_rows):
+        now = datetime.now()
+        reports = build_reports(rows, report_date, now)
+        summary['users'] += len(reports)
+        for user_id in endpoint_written(mood_report_collection, reports, report_date):
+            del reports[user_id]
+            summary['skipped'] += 1
+        if dry_run or not reports:
+            continue
+        result = mood_report_collection.bulk_write(report_upserts(reports, now), ordered=False)
+        summary['upserted'] += result.upserted_count
+        summary['modified'] += result.modified_count
+
+    summary['seconds'] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate mood reports for all users")
+    parser.add_argument('--date', help="report date (default: today)")
+    parser.add_argument('--since', help="only include tracked days on or after this date")
+    parser.add_argument('--users', help="comma separated user ids (default: all users)")
+    parser.add_argument('--chunk-rows', type=int, default=50000, help="daily rows per pandas/bulk_write chunk")
+    parser.add_argument('--dry-run', action='store_true', help="compute reports without writing them")
+    args = parser.parse_args()
+
+    from backends import create_mongo_client
+
+    db = create_mongo_client()['wellness_ai']
+    user_ids = args.users.split(',') if args.users else None
+    summary = generate_reports(db, args.date, user_ids, args.since, args.chunk_rows, args.dry_run)
+    print(f"Generated reports for {summary['users']} users "
+          f"({summary['upserted']} new, {summary['modified']} updated, "
+          f"{summary['skipped']} already written by the endpoint) in {summary['seconds']}s")
+    if summary['days_without_chat_scores']:
+        print(f"Skipped {summary['days_without_chat_scores']} days recorded before chat_scores existed, "
+              f"run migrate_mood_timeseries.py --backfill-only to include them")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""Precomputed PDF chunk store.
+
+A build step writes every chunk's text, metadata and embedding into one
+versioned binary file. The server memory-maps it at startup, so there is no
+PDF parsing on cold start and no SQLite read per query: chunk text is sliced
+straight out of the mapped buffer and similarity search runs on a zero-copy
+NumPy view of the embedding matrix.
+
+File layout (little endian):
+
+    magic "TWCHUNK1" | uint32 header length | JSON header (padded to 64 bytes)
+    index       count x 4 uint64: text offset, text length, metadata offset, metadata length
+    texts       UTF-8 chunk texts, back to back
+    metadata    UTF-8 JSON objects, back to back
+    embeddings  count x dim float32, L2 normalized, 64-byte aligned
+
+Usage:
+    python chunk_store.py build [--pdf mental_health_Document.pdf] [--out chunk_store.bin]
+    python chunk_store.py build --from-chroma ./chroma_db
+    python chunk_store.py info [--path chunk_store.bin]
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b'TWCHUNK1'
+FORMAT_VERSION = 1
+ALIGN = 64
+
+
+def _padding(offset):
+    return (-offset) % ALIGN
+
+
+def write_chunk_store(path, texts, metadatas, embeddings, info=None):
+    embeddings = np.asarray(embeddings, dtype='<f4')
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+    text_blobs = [text.encode('utf-8') for text in texts]
+    meta_blobs = [json.dumps(metadata or {}).encode('utf-8') for metadata in metadatas]
+    index = np.zeros((len(texts), 4), dtype='<u8')
+    index[:, 1] = [len(blob) for blob in text_blobs]
+    index[:, 0] = np.concatenate([[0], np.cumsum(index[:-1, 1])]) if len(texts) else []
+    index[:, 3] = [len(blob) for blob in meta_blobs]
+    index[:, 2] = np.concatenate([[0], np.cumsum(index[:-1, 3])]) if len(texts) else []
+    text_size = int(index[:, 1].sum())
+    meta_size = int(index[:, 3].sum())
+
+    def layout(header_length):
+        index_offset = len(MAGIC) + 4 + header_length
+        text_offset = index_offset + index.nbytes
+        meta_offset = text_offset + text_size
+        embeddings_offset = meta_offset + meta_size + _padding(meta_offset + meta_size)
+        return {
+            'index_offset': index_offset,
+            'text_offset': text_offset,
+            'meta_offset': meta_offset,
+            'embeddings_offset': embeddings_offset
+        }
+
+    header = {
+        'version': FORMAT_VERSION,
+        'count': len(texts),
+        'dim': int(embeddings.shape[1]) if len(texts) else 0,
+        'created_at': datetime.now().isoformat(),
+        **(info or {})
+    }
+    # Offsets depend on the header size, so pad the header until both agree
+    header_length = 0
+    while True:
+        header.update(layout(header_length))
+        encoded = json.dumps(header).encode('utf-8')
+        if len(encoded) <= header_length:
+            break
+        header_length = len(encoded) + _padding(len(MAGIC) + 4 + len(encoded))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', header_length))
+        f.write(encoded + b' ' * (header_length - len(encoded)))
+        f.write(index.tobytes())
+        f.write(b''.join(text_blobs))
+        f.write(b''.join(meta_blobs))
+        f.write(b'\0' * (header['embeddings_offset'] - header['meta_offset'] - meta_size))
+        f.write(embeddings.tobytes())
+    return header
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a chunk store file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a chunk store file")
+        (header_length,) = struct.unpack_from('<I', self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mm[start:start + header_length].decode('utf-8'))
+        if self.header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store version {self.header['version']}")
+
+        self.count = self.header['count']
+        self.dim = self.header['dim']
+        self.index = np.frombuffer(self._mm, dtype='<u8', count=self.count * 4,
+                                   offset=self.header['index_offset']).reshape(self.count, 4)
+        self.embeddings = np.frombuffer(self._mm, dtype='<f4', count=self.count * self.dim,
+                                        offset=self.header['embeddings_offset']).reshape(self.count, self.dim)
+
+    def __len__(self):
+        return self.count
+
+    def text(self, i):
+        start = self.header['text_offset'] + int(self.index[i, 0])
+        return self._mm[start:start + int(self.index[i, 1])].decode('utf-8')
+
+    def metadata(self, i):
+        start = self.header['meta_offset'] + int(self.index[i, 2])
+        return json.loads(self._mm[start:start + int(self.index[i, 3])].decode('utf-8'))
+
+    def chunk(self, i, with_embedding=False):
+        chunk = {'id': int(i), 'text': self.text(i), 'metadata': self.metadata(i)}
+        if with_embedding:
+            chunk['embedding'] = self.embeddings[i]
+        return chunk
+
+    def search(self, query_embedding, k):
+        """Top-k chunk indices by cosine similarity (embeddings are stored normalized)."""
+        if not self.count:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.embeddings @ (query / norm if norm else query)
+        k = min(k, self.count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])].tolist()
+
+
+class ChunkStoreSource:
+    """RetrievalStage source backed by a ChunkStore, the alternative to ChromaChunkSource."""
+
+    def __init__(self, store, embeddings, embedding_backend=None):
+        built_with = store.header.get('embedding_backend')
+        if embedding_backend and built_with and built_with != embedding_backend:
+            raise ValueError(
+                f"{store.path} was built with the '{built_with}' embedding backend, "
+                f"but EMBEDDING_BACKEND is '{embedding_backend}'"
+            )
+        self.store = store
+        self.embeddings = embeddings
+
+    def search(self, query, fetch_k):
+        query_embedding = self.embeddings.embed_query(query)
+        return query_embedding, [
+            self.store.chunk(i, with_embedding=True) for i in self.store.search(query_embedding, fetch_k)
+        ]
+
+    def fetch(self, chunk_ids):
+        return {chunk_id: self.store.chunk(chunk_id) for chunk_id in chunk_ids}
+
+
+def build_from_pdf(pdf_path, out_path, embedding_backend, chunk_size=500, chunk_overlap=50):
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from backends import create_embeddings
+
+    documents = PyPDFLoader(pdf_path).load()
+    texts = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    ).split_documents(documents)
+    contents = [doc.page_content for doc in texts]
+    vectors = create_embeddings(embedding_backend).embed_documents(contents)
+    return write_chunk_store(out_path, contents, [doc.metadata for doc in texts], vectors, {
+        'source': pdf_path,
+        'embedding_backend': embedding_backend,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap
+    })
+
+
+def build_from_chroma(db_path, out_path, embedding_backend):
+    """Exports an existing Chroma store without re-parsing the PDF or re-embedding."""
+    import chromadb
+
+    # Opening a persistent store rewrites its segment files, so read from a throwaway copy
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = os.path.join(tmp, 'chroma')
+        shutil.copytree(db_path, copy_path)
+        client = chromadb.PersistentClient(path=copy_path)
+        collection = client.get_collection('langchain')
+        result = collection.get(include=['documents', 'metadatas', 'embeddings'])
+        del client, collection
+    return write_chunk_store(out_path, result['documents'], result['metadatas'], result['embeddings'], {
+        'source': db_path,
+        'embedding_backend': embedding_backend
+    })
+
+
+def main():
+    from backends import embedding_backend_name
+
+    parser = argparse.ArgumentParser(description="Build or inspect the precomputed chunk store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build')
+    build_parser.add_argument('--pdf', default='mental_health_Document.pdf')
+    build_parser.add_argument('--from-chroma', help="export an existing Chroma directory instead of parsing the PDF")
+    build_parser.add_argument('--out', default='chunk_store.bin')
+    build_parser.add_argument('--embedding-backend', default=embedding_backend_name())
+
+    info_parser = subparsers.add_parser('info')
+    info_parser.add_argument('--path', default='chunk_store.bin')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        if args.from_chroma:
+            header = build_from_chroma(args.from_chroma, args.out, args.embedding_backend)
+        else:
+            header = build_from_pdf(args.pdf, args.out, args.embedding_backend)
+        print(f"Wrote {header['count']} chunks ({header['dim']}-d embeddings) to {args.out}")
+    else:
+        store = ChunkStore(args.path)
+        print(json.dumps(store.header, indent=2))
+
+
+if __name__ == '__main__':
+    main()
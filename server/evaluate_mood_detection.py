@@ -1,5 +1,5 @@
+import argparse
 import pandas as pd
-import requests
 from sklearn.metrics import classification_report, confusion_matrix
 
 # CONFIGURE THIS: Your Flask API endpoint for mood prediction
@@ -10,6 +10,8 @@ def predict_mood_api(message):
     Calls your Flask API to get the predicted mood for a message.
     Adjust the payload and response parsing as per your API.
     """
+    import requests
+
     try:
         response = requests.post(API_URL, json={"message": message})
         response.raise_for_status()
@@ -21,13 +23,33 @@ def predict_mood_api(message):
         return "unknown"
 
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate mood detection against labeled messages")
+    parser.add_argument("--data", default="mood_test_data.csv")
+    parser.add_argument("--model", help="score a local mood_classifier weight file instead of calling the API")
+    parser.add_argument("--holdout", type=float,
+                        help="train a model on the rest of --data and score this held-out share of it instead")
+    args = parser.parse_args()
+
     # Load test data
-    df = pd.read_csv("mood_test_data.csv")
+    df = pd.read_csv(args.data)
     messages = df["message"].tolist()
     true_moods = df["true_mood"].tolist()
 
-    # Get predictions from the API
-    predicted_moods = [predict_mood_api(msg) for msg in messages]
+    if args.holdout:
+        # Same training and confidence gate as `mood_classifier.py train`, scored on rows it never saw
+        from mood_classifier import fit, holdout_split
+        train_rows, test_rows = holdout_split(true_moods, args.holdout)
+        model, _ = fit([messages[i] for i in train_rows], [true_moods[i] for i in train_rows])
+        messages = [messages[i] for i in test_rows]
+        true_moods = [true_moods[i] for i in test_rows]
+        predicted_moods = model.predict(messages)
+    elif args.model:
+        # Batch inference with the trained classifier and its confidence gate, as served by the API
+        from mood_classifier import MoodClassifier
+        predicted_moods = MoodClassifier.load(args.model).predict(messages)
+    else:
+        # Get predictions from the API
+        predicted_moods = [predict_mood_api(msg) for msg in messages]
 
     # Print and save the classification report
     report = classification_report(true_moods, predicted_moods, output_dict=True)
@@ -0,0 +1,61 @@
+"""Gunicorn settings, picked up automatically by `gunicorn app:app`.
+
+With SERVING_MODE=worker the master starts a single model server (see
+model_server.py) before forking, and every HTTP worker forwards embedding,
+retrieval and sentiment calls to it over a Unix socket. The model is loaded
+once per host instead of once per worker.
+
+The per-user state (chat history, conversation memory, response cache
+versions and the scheduler's per-user slots) lives in the model server too,
+so any worker can serve any user and worker mode defaults to
+2 * cores + 1 workers (WEB_CONCURRENCY overrides). Standalone mode keeps
+that state in-process and therefore stays on one worker.
+"""
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+serving_mode = os.getenv('SERVING_MODE', 'standalone')
+
+# Request threads per worker (gthread). Chat and report requests only wait on
+# the scheduler's pools (see scheduler.py), so cheap endpoints need threads of
+# their own to keep being served during a burst.
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+if serving_mode == 'worker':
+    workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+    _model_server = None
+
+    def on_starting(server):
+        global _model_server
+        from model_server import DEFAULT_ADDRESS, ModelClient, authkey_from_env
+
+        # Workers are forked from the master, so they inherit these settings
+        os.environ.setdefault('MODEL_SERVER_ADDRESS', DEFAULT_ADDRESS)
+        os.environ.setdefault('MODEL_SERVER_AUTHKEY', secrets.token_hex(16))
+        _model_server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_server.py')]
+        )
+
+        client = ModelClient(os.environ['MODEL_SERVER_ADDRESS'], authkey_from_env())
+        deadline = time.monotonic() + float(os.getenv('MODEL_SERVER_START_TIMEOUT', 300))
+        while True:
+            try:
+                client.call('ping')
+                break
+            except Exception:
+                if _model_server.poll() is not None:
+                    raise RuntimeError("Model server exited during startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Model server did not start in time")
+                time.sleep(0.5)
+        server.log.info("Model server ready at %s", os.environ['MODEL_SERVER_ADDRESS'])
+
+    def on_exit(server):
+        if _model_server and _model_server.poll() is None:
+            _model_server.terminate()
+            _model_server.wait(timeout=10)
@@ -0,0 +1,173 @@
+"""Per-user conversation memory with a bounded prompt footprint.
+
+Recent turns are kept verbatim inside a sliding token window. Turns that fall
+out of the window are folded into a rolling summary in a background thread,
+so building the context for a prompt never waits on the LLM and its size is
+capped at `window_tokens + summary_tokens` however long the conversation runs.
+
+ChatHistory keeps every turn with its sentiment for /api/chat/report. With
+SERVING_MODE=worker both live in the model server, so every HTTP worker sees
+the same conversation (see model_server.py).
+"""
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from retrieval import estimate_tokens
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a supportive mental health companion.
+Keep what matters for future replies: how the user feels, what is troubling them and anything they asked to remember.
+Write at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+def format_turns(turns):
+    return '\n'.join(f"User: {turn['message']}\nChatbot: {turn['response']}" for turn in turns)
+
+
+def truncate_tokens(text, max_tokens):
+    words = text.split()
+    while words and estimate_tokens(' '.join(words)) > max_tokens:
+        words = words[:-max(1, len(words) // 10)]
+    return ' '.join(words)
+
+
+class LLMSummarizer:
+    """Folds turns into the running summary with the chat LLM."""
+
+    def __init__(self, llm, max_words=100):
+        self.llm = llm
+        self.max_words = max_words
+
+    def __call__(self, summary, turns):
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.max_words,
+            summary=summary or '(none yet)',
+            turns=format_turns(turns)
+        )
+        result = self.llm.invoke(prompt)
+        return getattr(result, 'content', result).strip()
+
+
+def extractive_summarize(summary, turns):
+    """Fallback summary: keeps the user's side of the dropped turns."""
+    recent = ' '.join(turn['message'] for turn in turns)
+    return f"{summary} {recent}".strip()
+
+
+class ConversationMemory:
+    """Sliding token window of recent turns plus an asynchronously updated summary."""
+
+    def __init__(self, summarizer, window_tokens=600, summary_tokens=150, max_users=10000):
+        self.summarizer = summarizer
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.max_users = max_users
+
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='memory-summary')
+
+    def _state(self, user_id):
+        state = self._users.get(user_id)
+        if state is None:
+            state = {
+                'turns': deque(),
+                'window_tokens': 0,
+                'summary': '',
+                'pending': [],
+                'summarizing': False
+            }
+            self._users[user_id] = state
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    def add_turn(self, user_id, message, response):
+        if estimate_tokens(message) + estimate_tokens(response) > self.window_tokens:
+            # A single oversized turn is cut down so the window stays bounded
+            message = truncate_tokens(message, self.window_tokens // 2)
+            response = truncate_tokens(response, self.window_tokens - estimate_tokens(message))
+        turn = {
+            'message': message,
+            'response': response,
+            'tokens': estimate_tokens(message) + estimate_tokens(response)
+        }
+        with self._lock:
+            state = self._state(user_id)
+            state['turns'].append(turn)
+            state['window_tokens'] += turn['tokens']
+            # The latest turn always stays in the window (it fits, see above)
+            while state['window_tokens'] > self.window_tokens and len(state['turns']) > 1:
+                dropped = state['turns'].popleft()
+                state['window_tokens'] -= dropped['tokens']
+                state['pending'].append(dropped)
+            schedule = bool(state['pending']) and not state['summarizing']
+            if schedule:
+                state['summarizing'] = True
+        if schedule:
+            self._executor.submit(self._fold, user_id, state)
+
+    def _fold(self, user_id, state):
+        while True:
+            with self._lock:
+                turns = state['pending']
+                state['pending'] = []
+                summary = state['summary']
+                if not turns:
+                    state['summarizing'] = False
+                    return
+            try:
+                new_summary = self.summarizer(summary, turns)
+            except Exception as e:
+                print(f"Error updating conversation summary for user {user_id}: {str(e)}")
+                new_summary = extractive_summarize(summary, turns)
+            with self._lock:
+                state['summary'] = truncate_tokens(new_summary, self.summary_tokens)
+
+    def build_context(self, user_id):
+        """Returns the compact conversation context for the next prompt ('' for new users)."""
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                return ''
+            summary = state['summary']
+            turns = list(state['turns'])
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation: {summary}")
+        if turns:
+            parts.append(format_turns(turns))
+        if not parts:
+            return ''
+        return 'Conversation so far:\n' + '\n'.join(parts) + '\n'
+
+    def clear(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+class ChatHistory:
+    """Every chat turn of a user with its sentiment, oldest first."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def append(self, user_id, entry):
+        with self._lock:
+            self._users.setdefault(user_id, []).append(entry)
+
+    def get(self, user_id):
+        with self._lock:
+            return list(self._users.get(user_id, []))
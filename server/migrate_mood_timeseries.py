@@ -0,0 +1,165 @@
+"""Copies `mood_tracking` daily documents into the `mood_observations` time-series collection.
+
+The daily documents only keep the scores, not when each one was recorded, so
+every score becomes one observation with timestamps spread evenly between the
+document's created_at and last_updated. Scores also listed in the document's
+`chat_scores` get source 'chat' (so chat-only reports keep working), the
+others 'migrated'. The day's chat moods go on its first chat observation and
+the remaining detected moods on its first other one, which keeps the daily
+summaries (and the `mood_daily` view) identical to the old documents.
+
+Daily documents written before `chat_scores`/`chat_moods` existed are
+backfilled first: the questionnaires stored for the same user and day were
+folded in as total_score / 10 and their positive/neutral/negative mood, so
+removing those leaves the chat scores and moods. With MOOD_STORAGE=daily,
+run only that step so bulk_reports.py covers the existing history:
+
+    python migrate_mood_timeseries.py --backfill-only
+
+Usage:
+    python migrate_mood_timeseries.py [--users id1,id2] [--batch-size 5000] [--drop] [--dry-run] [--backfill-only]
+
+Then start the app with MOOD_STORAGE=timeseries.
+"""
+import argparse
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from mood_store import TimeSeriesMoodStorage, observation
+
+
+def chat_fields(doc, questionnaires):
+    """chat_scores/chat_moods of a daily document written before those fields existed."""
+    chat_scores = list(doc.get('mood_scores') or [])
+    questionnaire_moods = set()
+    for questionnaire in questionnaires:
+        score = questionnaire.get('total_score', 0) / 10
+        if score in chat_scores:
+            chat_scores.remove(score)
+        questionnaire_moods.add(questionnaire.get('mood'))
+    chat_moods = [m for m in doc.get('detected_moods') or [] if m not in questionnaire_moods]
+    return {'chat_scores': chat_scores, 'chat_moods': chat_moods}
+
+
+def backfill_chat_scores(db, user_ids=None, batch_size=5000, dry_run=False):
+    """Adds chat_scores/chat_moods to every mood_tracking document without them."""
+    query = {'chat_scores': {'$exists': False}}
+    if user_ids:
+        query['user_id'] = {'$in': list(user_ids)}
+    summary = {'days': 0}
+    batch = []
+
+    def flush():
+        questionnaires = {}
+        for questionnaire in db['mood_questionnaire'].find(
+            {'user_id': {'$in': list({doc['user_id'] for doc in batch})},
+             'date': {'$in': list({doc['date'] for doc in batch})}},
+            {'user_id': 1, 'date': 1, 'total_score': 1, 'mood': 1}
+        ):
+            questionnaires.setdefault((questionnaire['user_id'], questionnaire['date']), []).append(questionnaire)
+        if not dry_run:
+            db['mood_tracking'].bulk_write([
+                UpdateOne(
+                    {'_id': doc['_id'], 'chat_scores': {'$exists': False}},
+                    {'$set': chat_fields(doc, questionnaires.get((doc['user_id'], doc['date']), []))}
+                )
+                for doc in batch
+            ], ordered=False)
+        summary['days'] += len(batch)
+        batch.clear()
+
+    for doc in db['mood_tracking'].find(query, {'user_id': 1, 'date': 1, 'mood_scores': 1, 'detected_moods': 1}):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return summary
+
+
+def observations_for(doc):
+    scores = doc.get('mood_scores') or []
+    day_start = datetime.fromisoformat(doc['date'])
+    first = doc.get('created_at') or day_start
+    last = doc.get('last_updated') or first
+    if last.date() != first.date() or last < first:
+        last = first  # keep every observation on the document's day
+    step = (last - first) / (len(scores) - 1) if len(scores) > 1 else timedelta(0)
+
+    chat_left = Counter(doc.get('chat_scores') or [])
+    chat_moods = doc.get('chat_moods') or []
+    other_moods = [m for m in doc.get('detected_moods', []) if m not in chat_moods]
+    observations = []
+    for i, score in enumerate(scores):
+        if chat_left[score] > 0:
+            chat_left[score] -= 1
+            source, moods, chat_moods = 'chat', chat_moods, []
+        else:
+            source, moods, other_moods = 'migrated', other_moods, []
+        observations.append(observation(doc['user_id'], first + step * i, score, source, moods))
+    if other_moods and observations:
+        # Every score was a chat one, keep the remaining moods on the day anyway
+        observations[0]['detected_moods'].extend(other_moods)
+    return observations
+
+
+def migrate(db, user_ids=None, batch_size=5000, drop=False, dry_run=False):
+    started = time.perf_counter()
+    storage = TimeSeriesMoodStorage(db)
+    if not dry_run:
+        if drop:
+            db.drop_collection('mood_daily')
+            db.drop_collection('mood_observations')
+        elif storage.collection.estimated_document_count():
+            raise SystemExit("mood_observations is not empty, rerun with --drop to rebuild it")
+        storage.ensure_schema()
+
+    backfilled = backfill_chat_scores(db, user_ids, batch_size, dry_run)['days']
+    query = {'user_id': {'$in': list(user_ids)}} if user_ids else {}
+    summary = {'days': 0, 'observations': 0, 'backfilled': backfilled}
+    batch = []
+    for doc in db['mood_tracking'].find(query).sort([('user_id', 1), ('date', 1)]):
+        batch.extend(observations_for(doc))
+        summary['days'] += 1
+        if len(batch) >= batch_size:
+            summary['observations'] += len(batch)
+            if not dry_run:
+                storage.record(batch)
+            batch = []
+    if batch:
+        summary['observations'] += len(batch)
+        if not dry_run:
+            storage.record(batch)
+
+    summary['seconds'] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate mood_tracking into the mood_observations time-series collection")
+    parser.add_argument('--users', help="comma separated user ids (default: all users)")
+    parser.add_argument('--batch-size', type=int, default=5000, help="observations per insert_many")
+    parser.add_argument('--drop', action='store_true', help="drop mood_observations and mood_daily first")
+    parser.add_argument('--dry-run', action='store_true', help="count what would be migrated without writing")
+    parser.add_argument('--backfill-only', action='store_true',
+                        help="only add chat_scores/chat_moods to older mood_tracking days (MOOD_STORAGE=daily)")
+    args = parser.parse_args()
+
+    from backends import create_mongo_client
+
+    db = create_mongo_client()['wellness_ai']
+    user_ids = args.users.split(',') if args.users else None
+    if args.backfill_only:
+        summary = backfill_chat_scores(db, user_ids, args.batch_size, args.dry_run)
+        print(f"Backfilled chat scores on {summary['days']} daily documents")
+        return
+    summary = migrate(db, user_ids, args.batch_size, args.drop, args.dry_run)
+    print(f"Migrated {summary['days']} daily documents into {summary['observations']} observations "
+          f"({summary['backfilled']} backfilled with chat scores first) in {summary['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""Shared model components, per-user state and the dedicated model-server process.
+
+The embedding model, the retrieval stage (Chroma or the mmapped chunk store)
+and the TextBlob sentiment lexicon are the memory-heavy parts of the app.
+The chat history, the conversation memory, the response cache versions and
+the scheduler's per-user slots are per-user state every worker must agree on.
+With SERVING_MODE=standalone (the default) the process holds all of it itself.
+With SERVING_MODE=worker it lives once in a model-server process listening
+on a local Unix socket, and the Flask workers only hold small clients:
+
+    SERVING_MODE=worker gunicorn app:app          # gunicorn.conf.py starts the model server
+    python model_server.py --address /tmp/talkwell-model.sock
+
+MODEL_SERVER_ADDRESS and MODEL_SERVER_AUTHKEY must match on both sides.
+"""
+import argparse
+import os
+import queue
+import threading
+from multiprocessing.connection import Client, Listener
+
+from langchain_core.documents import Document
+
+from memory import ChatHistory, ConversationMemory, LLMSummarizer
+from response_cache import UserVersions
+from retrieval import ChromaChunkSource, RetrievalStage
+from scheduler import UserSlots
+
+DEFAULT_ADDRESS = '/tmp/talkwell-model.sock'
+
+
+# --- Components (loaded in-process or inside the model server) ---
+
+def create_vector_db(db_path, embeddings):
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_community.vectorstores import Chroma
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    loader = PyPDFLoader("mental_health_Document.pdf")
+    documents = loader.load()
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    texts = text_splitter.split_documents(documents)
+    vector_db = Chroma.from_documents(texts, embeddings, persist_directory=db_path)
+    vector_db.persist()
+    return vector_db
+
+
+def create_chunk_source(embeddings):
+    from backends import embedding_backend_name
+    from chunk_store import ChunkStore, ChunkStoreSource
+
+    db_path = os.getenv('CHROMA_DB_PATH', './chroma_db')
+    chunk_store_path = os.getenv('CHUNK_STORE_PATH', './chunk_store.bin')
+
+    if os.path.exists(chunk_store_path):
+        # Precomputed store (python chunk_store.py build): no PDF parsing, no per-query SQLite reads
+        return ChunkStoreSource(ChunkStore(chunk_store_path), embeddings, embedding_backend_name())
+
+    from langchain_community.vectorstores import Chroma
+
+    if not os.path.exists(db_path):
+        vector_db = create_vector_db(db_path, embeddings)
+    else:
+        vector_db = Chroma(persist_directory=db_path, embedding_function=embeddings)
+    return ChromaChunkSource(vector_db)
+
+
+def setup_retrieval_stage(chunk_source):
+    return RetrievalStage(
+        chunk_source,
+        k=int(os.getenv('RETRIEVAL_K', 3)),
+        fetch_k=int(os.getenv('RETRIEVAL_FETCH_K', 12)),
+        max_context_tokens=int(os.getenv('RETRIEVAL_MAX_CONTEXT_TOKENS', 400)),
+        min_relevance=float(os.getenv('RETRIEVAL_MIN_RELEVANCE', 0.75)),
+        rerank=os.getenv('RETRIEVAL_RERANK', 'mmr'),
+        cache_size=int(os.getenv('RETRIEVAL_CACHE_SIZE', 256))
+    )
+
+
+def setup_conversation_memory(llm):
+    return ConversationMemory(
+        LLMSummarizer(llm),
+        window_tokens=int(os.getenv('MEMORY_WINDOW_TOKENS', 600)),
+        summary_tokens=int(os.getenv('MEMORY_SUMMARY_TOKENS', 150))
+    )
+
+
+def sentiment_polarity(text):
+    from textblob import TextBlob
+    return TextBlob(text).sentiment.polarity
+
+
+class ModelComponents:
+    """Everything the model server hosts, with a name -> handler dispatch table."""
+
+    def __init__(self, llm=None):
+        from backends import create_embeddings, create_llm
+
+        self.embeddings = create_embeddings()  # EMBEDDING_BACKEND=hashing for offline runs
+        self.retrieval_stage = setup_retrieval_stage(create_chunk_source(self.embeddings))
+        self.chat_history = ChatHistory()
+        self.conversation_memory = setup_conversation_memory(llm or create_llm())
+        self.versions = UserVersions()
+        self.slots = UserSlots.from_env()
+        self.handlers = {
+            'retrieve': self.retrieve,
+            'retrieval_stats': self.retrieval_stage.stats,
+            'polarity': sentiment_polarity,
+            'history_append': self.chat_history.append,
+            'history_get': self.chat_history.get,
+            'memory_add_turn': self.conversation_memory.add_turn,
+            'memory_context': self.conversation_memory.build_context,
+            'memory_clear': self.conversation_memory.clear,
+            'version_bump': self.versions.bump,
+            'version_get': self.versions.get,
+            'version_count': self.versions.count,
+            'slot_acquire': self.slots.acquire,
+            'slot_release': self.slots.release,
+            'slot_active_users': self.slots.active_users,
+            'ping': lambda: 'pong'
+        }
+
+    def retrieve(self, query):
+        return [
+            {'page_content': doc.page_content, 'metadata': doc.metadata}
+            for doc in self.retrieval_stage.retrieve(query)
+        ]
+
+    def handle(self, op, args):
+        if op not in self.handlers:
+            raise ValueError(f"Unknown model server operation '{op}'")
+        return self.handlers[op](*args)
+
+
+# --- Server ---
+
+def _serve_connection(components, conn):
+    with conn:
+        while True:
+            try:
+                op, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                conn.send(('ok', components.handle(op, args)))
+            except Exception as e:
+                print(f"Model server error in {op}: {str(e)}")
+                conn.send(('error', str(e)))
+
+
+def serve(address, authkey):
+    print("Loading shared model components...")
+    components = ModelComponents()
+    if os.path.exists(address):
+        os.remove(address)  # stale socket from a previous run
+    with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+        print(f"Model server listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Failed handshakes (wrong authkey, dropped clients) must not stop the server
+                print(f"Model server rejected a connection: {str(e)}")
+                continue
+            threading.Thread(target=_serve_connection, args=(components, conn), daemon=True).start()
+
+
+# --- Client (used by the Flask workers) ---
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelClient:
+    """Thread-safe pool of connections to the model server."""
+
+    def __init__(self, address, authkey, pool_size=4):
+        self.address = address
+        self.authkey = authkey
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv('MODEL_SERVER_ADDRESS', DEFAULT_ADDRESS),
+            authkey_from_env(),
+            pool_size=int(os.getenv('MODEL_SERVER_POOL_SIZE', 4))
+        )
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return Client(self.address, family='AF_UNIX', authkey=self.authkey)
+
+    def _release(self, conn):
+        if self._pool.qsize() < self.pool_size:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    def call(self, op, *args):
+        # A pooled connection may have gone stale (model server restart), so retry once on a new one
+        for attempt in range(2):
+            conn = None
+            try:
+                conn = self._acquire()
+                conn.send((op, args))
+                status, result = conn.recv()
+            except (EOFError, OSError) as e:
+                if conn is not None:
+                    conn.close()
+                if attempt:
+                    raise ModelServerError(f"Model server unavailable at {self.address}: {str(e)}")
+                continue
+            self._release(conn)
+            if status == 'error':
+                raise ModelServerError(result)
+            return result
+
+    def polarity(self, text):
+        return self.call('polarity', text)
+
+
+class RemoteRetrievalStage:
+    """Same interface as RetrievalStage, answered by the model server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def retrieve(self, query):
+        return [Document(**doc) for doc in self.client.call('retrieve', query)]
+
+    def stats(self):
+        return self.client.call('retrieval_stats')
+
+
+class RemoteChatHistory:
+    """Same interface as ChatHistory, kept by the model server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def append(self, user_id, entry):
+        self.client.call('history_append', user_id, entry)
+
+    def get(self, user_id):
+        return self.client.call('history_get', user_id)
+
+
+class RemoteConversationMemory:
+    """Same interface as ConversationMemory, kept by the model server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def add_turn(self, user_id, message, response):
+        self.client.call('memory_add_turn', user_id, message, response)
+
+    def build_context(self, user_id):
+        return self.client.call('memory_context', user_id)
+
+    def clear(self, user_id):
+        self.client.call('memory_clear', user_id)
+
+
+class RemoteUserVersions:
+    """Same interface as UserVersions, kept by the model server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def bump(self, user_id):
+        self.client.call('version_bump', user_id)
+
+    def get(self, user_id):
+        return self.client.call('version_get', user_id)
+
+    def count(self):
+        return self.client.call('version_count')
+
+
+class RemoteUserSlots:
+    """Same interface as UserSlots, kept by the model server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def acquire(self, class_name, user, limit):
+        return self.client.call('slot_acquire', class_name, user, limit)
+
+    def release(self, class_name, user):
+        try:
+            self.client.call('slot_release', class_name, user)
+        except ModelServerError as e:
+            # Runs on a scheduler pool thread; the lease frees the slot eventually
+            print(f"Error releasing scheduler slot: {str(e)}")
+
+    def active_users(self, class_name):
+        return self.client.call('slot_active_users', class_name)
+
+
+def authkey_from_env():
+    return os.getenv('MODEL_SERVER_AUTHKEY', 'talkwell-model-server').encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the shared model server")
+    parser.add_argument('--address', default=os.getenv('MODEL_SERVER_ADDRESS', DEFAULT_ADDRESS))
+    args = parser.parse_args()
+    serve(args.address, authkey_from_env())
+
+
+if __name__ == '__main__':
+    main()
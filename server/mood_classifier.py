@@ -0,0 +1,308 @@
+"""Lightweight mood classifier.
+
+Messages are turned into hashed word and character n-gram features and
+scored with a multinomial logistic regression. The model is trained offline
+from labeled CSVs (`message,true_mood`, like mood_test_data.csv) and saved to
+a single weight file that is memory-mapped at inference time, so every worker
+shares the same pages and scoring a batch is a handful of NumPy operations.
+
+The model only knows the labels it was trained on (happy, neutral, tired,
+anxious, sad for mood_training_data.csv). Predictions whose probability is
+below the model's `min_confidence` go to the keyword rules instead. `train`
+picks that threshold from stratified held-out splits (`--holdout`,
+`--seeds`), reports the held-out accuracy of every candidate, then fits the
+saved model on all rows.
+
+Usage:
+    python mood_classifier.py train --data mood_training_data.csv --out mood_model.bin [--holdout 0.2 --seeds 5]
+    python mood_classifier.py evaluate --model mood_model.bin --data mood_test_data.csv
+    python mood_classifier.py predict --model mood_model.bin "I'm worried about my exams"
+"""
+import argparse
+import csv
+import json
+import re
+import struct
+import time
+import zlib
+
+import numpy as np
+
+MAGIC = b'TWMOOD01'
+FORMAT_VERSION = 1
+HEADER_ALIGN = 64
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Thresholds tried by fit(); 0.0 serves the model alone
+CONFIDENCE_CANDIDATES = (0.0, 0.3, 0.4, 0.5, 0.6, 0.7)
+
+
+def keyword_mood(message):
+    """The original keyword rules, used without a model and for low-confidence predictions."""
+    if "happy" in message:
+        return "happy"
+    elif "sad" in message:
+        return "sad"
+    elif "tired" in message:
+        return "tired"
+    elif "anxious" in message or "worried" in message:
+        return "anxious"
+    return "neutral"
+
+
+class HashedNgramFeaturizer:
+    """Maps text to L2-normalized binary features: word 1-2 grams and char 3-5 grams of each word."""
+
+    def __init__(self, n_features=2 ** 15, word_ngrams=2, char_ngrams=(3, 5)):
+        self.n_features = n_features
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = tuple(char_ngrams)
+
+    def config(self):
+        return {
+            'n_features': self.n_features,
+            'word_ngrams': self.word_ngrams,
+            'char_ngrams': list(self.char_ngrams)
+        }
+
+    def _ngrams(self, text):
+        words = _WORD_RE.findall(text.lower())
+        for n in range(1, self.word_ngrams + 1):
+            for i in range(len(words) - n + 1):
+                yield 'w:' + ' '.join(words[i:i + n])
+        low, high = self.char_ngrams
+        for word in words:
+            padded = f'<{word}>'
+            for n in range(low, high + 1):
+                for i in range(len(padded) - n + 1):
+                    yield 'c:' + padded[i:i + n]
+
+    def transform(self, texts):
+        """Returns a CSR-style (indptr, indices, values) triple for a batch of texts."""
+        indptr = [0]
+        indices = []
+        for text in texts:
+            row = {zlib.crc32(gram.encode('utf-8')) % self.n_features for gram in self._ngrams(text)}
+            indices.extend(row)
+            indptr.append(len(indices))
+        indptr = np.array(indptr, dtype=np.int64)
+        indices = np.array(indices, dtype=np.int64)
+        lengths = np.diff(indptr)
+        values = np.repeat(1.0 / np.sqrt(np.maximum(lengths, 1)), lengths).astype(np.float32)
+        return indptr, indices, values
+
+
+def _scores(weights, bias, indptr, indices, values):
+    n_rows = len(indptr) - 1
+    logits = np.tile(np.asarray(bias, dtype=np.float32), (n_rows, 1))
+    if not len(indices):
+        return logits
+    starts = indptr[:-1]
+    nonempty = indptr[1:] > starts
+    contributions = weights[indices] * values[:, None]
+    logits[nonempty] += np.add.reduceat(contributions, starts[nonempty], axis=0)
+    return logits
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class MoodClassifier:
+    def __init__(self, featurizer, labels, weights, bias, min_confidence=0.0):
+        self.featurizer = featurizer
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.min_confidence = min_confidence
+        self._label_array = np.array(self.labels)
+
+    def predict_proba(self, texts):
+        return _softmax(_scores(self.weights, self.bias, *self.featurizer.transform(texts)))
+
+    def predict(self, texts, min_confidence=None, fallback=keyword_mood):
+        """Most likely label per text; below min_confidence (default: the model's own), fallback(text)."""
+        if not texts:
+            return []
+        if min_confidence is None:
+            min_confidence = self.min_confidence
+        proba = self.predict_proba(texts)
+        labels = self._label_array[np.argmax(proba, axis=1)].tolist()
+        if min_confidence > 0:
+            for i in np.flatnonzero(proba.max(axis=1) < min_confidence):
+                labels[i] = fallback(texts[i])
+        return labels
+
+    def predict_one(self, text, min_confidence=None, fallback=keyword_mood):
+        return self.predict([text], min_confidence, fallback)[0]
+
+    @classmethod
+    def train(cls, messages, moods, featurizer=None, epochs=300, learning_rate=30.0, l2=1e-4):
+        """Full-batch gradient descent on the softmax cross-entropy."""
+        featurizer = featurizer or HashedNgramFeaturizer()
+        labels = sorted(set(moods))
+        label_index = {label: i for i, label in enumerate(labels)}
+        targets = np.zeros((len(moods), len(labels)), dtype=np.float32)
+        targets[np.arange(len(moods)), [label_index[m] for m in moods]] = 1.0
+
+        indptr, indices, values = featurizer.transform(messages)
+        rows = np.repeat(np.arange(len(messages)), np.diff(indptr))
+        weights = np.zeros((featurizer.n_features, len(labels)), dtype=np.float32)
+        bias = np.zeros(len(labels), dtype=np.float32)
+
+        for _ in range(epochs):
+            error = (_softmax(_scores(weights, bias, indptr, indices, values)) - targets) / len(messages)
+            grad = np.zeros_like(weights)
+            np.add.at(grad, indices, error[rows] * values[:, None])
+            weights -= learning_rate * (grad + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(featurizer, labels, weights, bias)
+
+    def save(self, path):
+        """Writes magic, header length, JSON header, then aligned float32 weights and bias."""
+        header = json.dumps({
+            'version': FORMAT_VERSION,
+            'labels': self.labels,
+            'min_confidence': self.min_confidence,
+            'featurizer': self.featurizer.config()
+        }).encode('utf-8')
+        prefix = len(MAGIC) + 4 + len(header)
+        padding = (-prefix) % HEADER_ALIGN
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(header) + padding))
+            f.write(header + b' ' * padding)
+            f.write(np.ascontiguousarray(self.weights, dtype='<f4').tobytes())
+            f.write(np.ascontiguousarray(self.bias, dtype='<f4').tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Memory-maps the weights; pages are shared between processes loading the same file."""
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a mood model file")
+            (header_length,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported mood model version {header['version']}")
+
+        config = header['featurizer']
+        featurizer = HashedNgramFeaturizer(config['n_features'], config['word_ngrams'], config['char_ngrams'])
+        n_labels = len(header['labels'])
+        offset = len(MAGIC) + 4 + header_length
+        data = np.memmap(path, dtype='<f4', mode='r', offset=offset,
+                         shape=(config['n_features'] * n_labels + n_labels,))
+        weights = data[:-n_labels].reshape(config['n_features'], n_labels)
+        bias = np.array(data[-n_labels:])
+        return cls(featurizer, header['labels'], weights, bias, header.get('min_confidence', 0.0))
+
+
+def load_labeled_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.DictReader(f) if row.get('message')]
+    return [row['message'] for row in rows], [row['true_mood'].strip() for row in rows]
+
+
+def holdout_split(moods, fraction, seed=0):
+    """Stratified (train, test) row indices, `fraction` of every label held out."""
+    rng = np.random.default_rng(seed)
+    moods = np.array(moods)
+    train, test = [], []
+    for label in sorted(set(moods.tolist())):
+        rows = rng.permutation(np.flatnonzero(moods == label))
+        n_test = int(round(len(rows) * fraction))
+        test.extend(rows[:n_test].tolist())
+        train.extend(rows[n_test:].tolist())
+    return sorted(train), sorted(test)
+
+
+def fit(messages, moods, holdout=0.2, seeds=5, candidates=CONFIDENCE_CANDIDATES, **train_args):
+    """Trains on all rows, with min_confidence chosen on `seeds` held-out splits.
+
+    Returns (model, scores); scores maps every candidate threshold to its mean
+    held-out accuracy with the keyword fallback (0.0 is the model alone).
+    """
+    results = {threshold: [] for threshold in candidates}
+    for seed in range(seeds):
+        train_rows, test_rows = holdout_split(moods, holdout, seed)
+        model = MoodClassifier.train([messages[i] for i in train_rows], [moods[i] for i in train_rows], **train_args)
+        test_messages = [messages[i] for i in test_rows]
+        test_moods = np.array([moods[i] for i in test_rows], dtype=object)
+        for threshold in candidates:
+            results[threshold].append(np.mean(np.array(model.predict(test_messages, threshold), dtype=object) == test_moods))
+    scores = {threshold: float(np.mean(accuracies)) for threshold, accuracies in results.items()}
+
+    # The lowest of the best thresholds, so the keyword rules only take over where they measurably help
+    best = max(scores.values())
+    model = MoodClassifier.train(messages, moods, **train_args)
+    model.min_confidence = min(threshold for threshold, score in scores.items() if score >= best - 1e-9)
+    return model, scores
+
+
+def report_accuracy(model, messages, moods):
+    moods = np.array(moods, dtype=object)
+    served = np.mean(np.array(model.predict(messages), dtype=object) == moods)
+    alone = np.mean(np.array(model.predict(messages, 0.0), dtype=object) == moods)
+    confident = np.mean(model.predict_proba(messages).max(axis=1) >= model.min_confidence)
+    return (f"accuracy {served:.2f} on {len(messages)} messages (model alone {alone:.2f}, "
+            f"{confident * 100:.0f}% above confidence {model.min_confidence}, the rest uses the keyword rules)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and run the mood classifier")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train')
+    train_parser.add_argument('--data', nargs='+', default=['mood_training_data.csv'])
+    train_parser.add_argument('--out', default='mood_model.bin')
+    train_parser.add_argument('--features', type=int, default=2 ** 15)
+    train_parser.add_argument('--epochs', type=int, default=300)
+    train_parser.add_argument('--holdout', type=float, default=0.2, help="share of rows held out per split")
+    train_parser.add_argument('--seeds', type=int, default=5, help="held-out splits the threshold is chosen on")
+
+    evaluate_parser = subparsers.add_parser('evaluate')
+    evaluate_parser.add_argument('--model', default='mood_model.bin')
+    evaluate_parser.add_argument('--data', default='mood_test_data.csv')
+
+    predict_parser = subparsers.add_parser('predict')
+    predict_parser.add_argument('--model', default='mood_model.bin')
+    predict_parser.add_argument('messages', nargs='+')
+
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        messages, moods = [], []
+        for path in args.data:
+            path_messages, path_moods = load_labeled_csv(path)
+            messages += path_messages
+            moods += path_moods
+        model, scores = fit(
+            messages, moods, args.holdout, args.seeds,
+            featurizer=HashedNgramFeaturizer(args.features), epochs=args.epochs
+        )
+        for threshold, score in scores.items():
+            label = 'model alone' if threshold == 0 else f"below {threshold} -> keyword rules"
+            print(f"Held-out accuracy {score:.2f} ({label})")
+        model.save(args.out)
+        print(f"Trained on {len(messages)} messages, labels {model.labels}, min_confidence {model.min_confidence}")
+        print(f"Model saved to {args.out}")
+    elif args.command == 'evaluate':
+        model = MoodClassifier.load(args.model)
+        messages, moods = load_labeled_csv(args.data)
+        started = time.perf_counter()
+        model.predict(messages)
+        elapsed = time.perf_counter() - started
+        print(f"{report_accuracy(model, messages, moods).capitalize()} "
+              f"({elapsed / len(messages) * 1e6:.1f} us per message in batch)")
+    else:
+        model = MoodClassifier.load(args.model)
+        for message, mood in zip(args.messages, model.predict(args.messages)):
+            print(f"{mood}\t{message}")
+
+
+if __name__ == '__main__':
+    main()
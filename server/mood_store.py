@@ -0,0 +1,432 @@
+"""Mood data writes shared by the chat and questionnaire endpoints.
+
+Daily summaries in `mood_tracking` are updated with a single upsert whose
+update is an aggregation pipeline, so appending scores and recomputing the
+average, distribution and primary mood happens atomically inside Mongo
+instead of as a find_one + update_one round trip.
+
+With MOOD_STORAGE=timeseries every score is instead appended as a single
+observation to the `mood_observations` time-series collection (metaField
+`user_id`), so writes never rewrite a growing document. Daily summaries are
+then computed by an aggregation pipeline, also published as the `mood_daily`
+view. Both layouts sit behind the same storage interface (`record`,
+`daily_summary`, `daily_scores`, `aggregate_daily_scores`,
+`days_without_chat_scores`); existing data is
+copied over with migrate_mood_timeseries.py.
+
+Questionnaire submissions may carry a client-generated `idempotency_key`. A
+partial unique index on (user_id, idempotency_key) turns retries into
+duplicate-key errors, which are reported back as duplicates instead of new
+entries. Until its mood update is recorded a questionnaire carries
+`mood_pending_since`; a retry finding that mark older than PENDING_TIMEOUT
+(the first attempt failed or died after the insert) records the update
+itself, so it is neither lost nor applied twice.
+"""
+import os
+from datetime import datetime, timedelta
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+
+DUPLICATE_KEY = 11000
+MAX_BATCH_SIZE = 500
+PENDING_TIMEOUT = timedelta(seconds=60)
+
+
+def ensure_indexes(mood_questionnaire_collection):
+    mood_questionnaire_collection.create_index(
+        [('user_id', 1), ('idempotency_key', 1)],
+        unique=True,
+        partialFilterExpression={'idempotency_key': {'$exists': True}},
+        name='user_idempotency_key'
+    )
+
+
+def _count_where(condition):
+    return {'$size': {'$filter': {'input': '$mood_scores', 'cond': condition}}}
+
+
+def summary_stages():
+    """Stages deriving mood_score, mood_distribution and primary_mood from mood_scores."""
+    return [
+        {'$set': {
+            # Half-up rounding to 2 decimals; $floor instead of $round so mongomock can evaluate it too
+            'mood_score': {'$divide': [{'$floor': {'$add': [{'$multiply': [{'$avg': '$mood_scores'}, 100]}, 0.5]}}, 100]},
+            'mood_distribution': {
+                'positive': _count_where({'$gt': ['$$this', 3]}),
+                'neutral': _count_where({'$and': [{'$gte': ['$$this', 2]}, {'$lte': ['$$this', 3]}]}),
+                'negative': _count_where({'$lt': ['$$this', 2]})
+            }
+        }},
+        # Ties resolve positive > neutral > negative, like max() over the distribution dict
+        {'$set': {'primary_mood': {'$switch': {
+            'branches': [
+                {
+                    'case': {'$and': [
+                        {'$gte': ['$mood_distribution.positive', '$mood_distribution.neutral']},
+                        {'$gte': ['$mood_distribution.positive', '$mood_distribution.negative']}
+                    ]},
+                    'then': 'positive'
+                },
+                {
+                    'case': {'$gte': ['$mood_distribution.neutral', '$mood_distribution.negative']},
+                    'then': 'neutral'
+                }
+            ],
+            'default': 'negative'
+        }}}}
+    ]
+
+
+def daily_mood_update(scores, moods, now, chat_scores=(), chat_moods=()):
+    """Update pipeline that appends scores/moods to a daily summary and recomputes its aggregates.
+
+    `chat_scores`/`chat_moods` are the subset coming from chat messages, kept
+    apart so chat-only reports (bulk_reports.py) can leave questionnaires out.
+    """
+    return [
+        {'$set': {
+            'mood_scores': {'$concatArrays': [{'$ifNull': ['$mood_scores', []]}, {'$literal': scores}]},
+            'detected_moods': {'$setUnion': [{'$ifNull': ['$detected_moods', []]}, {'$literal': moods}]},
+            'chat_scores': {'$concatArrays': [{'$ifNull': ['$chat_scores', []]}, {'$literal': list(chat_scores)}]},
+            'chat_moods': {'$setUnion': [{'$ifNull': ['$chat_moods', []]}, {'$literal': list(chat_moods)}]},
+            'created_at': {'$ifNull': ['$created_at', now]},
+            'last_updated': now
+        }}
+    ] + summary_stages()
+
+
+def observation(user_id, timestamp, score, source, detected_moods):
+    return {
+        'user_id': str(user_id),
+        'timestamp': timestamp,
+        'score': score,
+        'source': source,  # 'chat' or 'questionnaire'
+        'detected_moods': list(detected_moods)
+    }
+
+
+def _day_range(day):
+    start = datetime.combine(datetime.fromisoformat(day).date(), datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+# --- Storage layouts ---
+
+class DailyMoodStorage:
+    """One `mood_tracking` document per user and day with embedded score arrays.
+
+    `mood_scores`/`detected_moods` hold every source, `chat_scores`/`chat_moods`
+    only the chat messages. Days recorded before the chat fields existed have
+    no chat-only data and are left out of aggregate_daily_scores until
+    migrate_mood_timeseries.py --backfill-only adds it.
+    """
+
+    name = 'daily'
+
+    def __init__(self, db):
+        self.collection = db['mood_tracking']
+
+    def ensure_schema(self):
+        pass
+
+    def record(self, observations, now=None):
+        """Folds observations into their daily documents, one upsert per user and day."""
+        now = now or datetime.now()
+        daily = {}
+        for obs in observations:
+            entry = daily.setdefault(
+                (obs['user_id'], obs['timestamp'].date().isoformat()),
+                {'scores': [], 'moods': [], 'chat_scores': [], 'chat_moods': []}
+            )
+            entry['scores'].append(obs['score'])
+            entry['moods'].extend(m for m in obs['detected_moods'] if m not in entry['moods'])
+            if obs['source'] == 'chat':
+                entry['chat_scores'].append(obs['score'])
+                entry['chat_moods'].extend(m for m in obs['detected_moods'] if m not in entry['chat_moods'])
+        if daily:
+            self.collection.bulk_write([
+                UpdateOne(
+                    {'user_id': user_id, 'date': day},
+                    daily_mood_update(entry['scores'], entry['moods'], now, entry['chat_scores'], entry['chat_moods']),
+                    upsert=True
+                )
+                for (user_id, day), entry in daily.items()
+            ], ordered=False)
+
+    def daily_summary(self, user_id, day):
+        return self.collection.find_one({'user_id': user_id, 'date': day}, {'chat_scores': 0, 'chat_moods': 0})
+
+    def daily_scores(self, user_id):
+        """(date, total, count) for every tracked day of a user."""
+        for doc in self.collection.find({'user_id': user_id}, {'date': 1, 'mood_scores': 1}):
+            scores = doc.get('mood_scores') or []
+            if scores:
+                yield doc['date'], float(sum(scores)), len(scores)
+
+    def days_without_chat_scores(self, user_ids=None, since=None):
+        match = {'chat_scores': {'$exists': False}}
+        if user_ids:
+            match['user_id'] = {'$in': list(user_ids)}
+        if since:
+            match['date'] = {'$gte': since}
+        return self.collection.count_documents(match)
+
+    def aggregate_daily_scores(self, user_ids=None, since=None, batch_size=10000):
+        """Per user and day chat score totals for bulk_reports.py, sorted by user and date.
+
+        Only chat scores count, like /api/chat/report; questionnaires are left out.
+        """
+        match = {'chat_scores.0': {'$exists': True}}
+        if user_ids:
+            match['user_id'] = {'$in': list(user_ids)}
+        if since:
+            match['date'] = {'$gte': since}
+        return self.collection.aggregate([
+            {'$match': match},
+            {'$project': {'user_id': 1, 'date': 1, 'chat_scores': 1, 'chat_moods': 1}},
+            {'$unwind': '$chat_scores'},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'date': '$date'},
+                'total': {'$sum': '$chat_scores'},
+                'count': {'$sum': 1},
+                # Same thresholds as the daily summaries: > 3 positive, < 2 negative
+                'positive': {'$sum': {'$cond': [{'$gt': ['$chat_scores', 3]}, 1, 0]}},
+                'negative': {'$sum': {'$cond': [{'$lt': ['$chat_scores', 2]}, 1, 0]}},
+                'detected_moods': {'$addToSet': '$chat_moods'}
+            }},
+            {'$sort': {'_id.user_id': 1, '_id.date': 1}}
+        ], allowDiskUse=True, batchSize=batch_size)
+
+
+class TimeSeriesMoodStorage:
+    """One `mood_observations` time-series measurement per score, summarized on read."""
+
+    name = 'timeseries'
+    DAY = {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}}
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db['mood_observations']
+
+    def ensure_schema(self):
+        """Creates the time-series collection, its (user_id, timestamp) index and the mood_daily view."""
+        try:
+            self.db.create_collection('mood_observations', timeseries={
+                'timeField': 'timestamp',
+                'metaField': 'user_id',
+                'granularity': 'hours'  # a user logs a handful of scores per day
+            })
+        except CollectionInvalid:
+            pass  # already exists
+        except NotImplementedError:
+            print("Time-series collections not supported by this backend, using a plain collection")
+        self.collection.create_index([('user_id', 1), ('timestamp', 1)])
+        try:
+            self.db.command({'create': 'mood_daily', 'viewOn': 'mood_observations', 'pipeline': self.view_pipeline()})
+        except OperationFailure as e:
+            if e.code != 48:  # NamespaceExists
+                raise
+        except NotImplementedError:
+            pass  # mongomock has no views, the app reads through daily_summary() anyway
+
+    def record(self, observations, now=None):
+        if observations:
+            self.collection.insert_many([dict(obs) for obs in observations], ordered=False)
+
+    def summary_pipeline(self, match):
+        # $match first so the bucket index on user_id/timestamp narrows the scan
+        return [
+            {'$match': match},
+            {'$sort': {'timestamp': 1}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'date': self.DAY},
+                'mood_scores': {'$push': '$score'},
+                'detected_mood_sets': {'$addToSet': '$detected_moods'},
+                'created_at': {'$min': '$timestamp'},
+                'last_updated': {'$max': '$timestamp'}
+            }},
+            {'$project': {
+                '_id': 0,
+                'user_id': '$_id.user_id',
+                'date': '$_id.date',
+                'mood_scores': 1,
+                'detected_mood_sets': 1,
+                'created_at': 1,
+                'last_updated': 1
+            }}
+        ] + summary_stages()
+
+    def view_pipeline(self):
+        stages = self.summary_pipeline({})[1:]
+        stages.append({'$set': {'detected_moods': {'$reduce': {
+            'input': '$detected_mood_sets', 'initialValue': [], 'in': {'$setUnion': ['$$value', '$$this']}
+        }}}})
+        stages.append({'$unset': 'detected_mood_sets'})
+        return stages
+
+    def daily_summary(self, user_id, day):
+        start, end = _day_range(day)
+        docs = list(self.collection.aggregate(
+            self.summary_pipeline({'user_id': user_id, 'timestamp': {'$gte': start, '$lt': end}})
+        ))
+        if not docs:
+            return None
+        summary = docs[0]
+        moods = []
+        for mood_set in summary.pop('detected_mood_sets'):
+            mood_set = mood_set or []  # mongomock returns None for empty sets
+            moods.extend(m for m in mood_set if m not in moods)
+        summary['detected_moods'] = moods
+        return summary
+
+    def daily_scores(self, user_id):
+        for row in self.collection.aggregate([
+            {'$match': {'user_id': user_id}},
+            {'$group': {'_id': self.DAY, 'total': {'$sum': '$score'}, 'count': {'$sum': 1}}}
+        ]):
+            yield row['_id'], float(row['total']), row['count']
+
+    def days_without_chat_scores(self, user_ids=None, since=None):
+        return 0  # every observation has a source
+
+    def aggregate_daily_scores(self, user_ids=None, since=None, batch_size=10000):
+        match = {'source': 'chat'}
+        if user_ids:
+            match['user_id'] = {'$in': list(user_ids)}
+        if since:
+            match['timestamp'] = {'$gte': _day_range(since)[0]}
+        return self.collection.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'date': self.DAY},
+                'total': {'$sum': '$score'},
+                'count': {'$sum': 1},
+                'positive': {'$sum': {'$cond': [{'$gt': ['$score', 3]}, 1, 0]}},
+                'negative': {'$sum': {'$cond': [{'$lt': ['$score', 2]}, 1, 0]}},
+                'detected_moods': {'$addToSet': '$detected_moods'}
+            }},
+            {'$sort': {'_id.user_id': 1, '_id.date': 1}}
+        ], allowDiskUse=True, batchSize=batch_size)
+
+
+MOOD_STORAGES = {
+    DailyMoodStorage.name: DailyMoodStorage,
+    TimeSeriesMoodStorage.name: TimeSeriesMoodStorage
+}
+
+
+def create_mood_storage(db, name=None):
+    name = name or os.getenv('MOOD_STORAGE', 'daily')
+    if name not in MOOD_STORAGES:
+        raise ValueError(f"Unknown mood storage '{name}', expected one of {sorted(MOOD_STORAGES)}")
+    return MOOD_STORAGES[name](db)
+
+
+def questionnaire_mood(total_score):
+    return 'positive' if total_score >= 40 else 'neutral' if total_score >= 30 else 'negative'
+
+
+def build_questionnaire(submission, default_user_id=None, now=None):
+    """Validates one submission and returns the document to store (raises ValueError)."""
+    now = now or datetime.now()
+    user_id = submission.get('user_id', default_user_id)
+    if user_id is None:
+        raise ValueError('user_id is required')
+    total_score = submission.get('total_score', 0)
+    if isinstance(total_score, bool) or not isinstance(total_score, (int, float)):
+        raise ValueError('total_score must be a number')
+
+    created_at = now
+    if submission.get('created_at'):
+        # Offline clients send the time the questionnaire was actually filled in
+        created_at = datetime.fromisoformat(str(submission['created_at']).replace('Z', '+00:00'))
+        if created_at.tzinfo:
+            # Stored times are naive server-local, like datetime.now()
+            created_at = created_at.astimezone().replace(tzinfo=None)
+
+    document = {
+        'user_id': str(user_id),
+        'date': created_at.date().isoformat(),
+        'total_score': total_score,
+        'answers': submission.get('answers', {}),
+        'mood': questionnaire_mood(total_score),
+        'created_at': created_at
+    }
+    if submission.get('idempotency_key'):
+        document['idempotency_key'] = str(submission['idempotency_key'])
+    return document
+
+
+def submit_questionnaires(mood_questionnaire_collection, mood_storage, documents, now=None):
+    """Stores a batch of questionnaires and applies their daily mood updates.
+
+    Costs one bulk insert, one mood storage write and one update clearing
+    `mood_pending_since` (plus lookups when some submissions are duplicates).
+    Returns (created, duplicates, applied): duplicates are the stored
+    documents the retried submissions refer to, applied the created and
+    duplicate documents whose mood update this call recorded.
+    """
+    now = now or datetime.now()
+    if not documents:
+        return [], [], []
+
+    for doc in documents:
+        doc['mood_pending_since'] = now
+    duplicate_positions = set()
+    try:
+        mood_questionnaire_collection.bulk_write([InsertOne(doc) for doc in documents], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            if error.get('code') != DUPLICATE_KEY:
+                raise
+            duplicate_positions.add(error['index'])
+
+    created = [doc for i, doc in enumerate(documents) if i not in duplicate_positions]
+    duplicates = []
+    applied = list(created)
+    if duplicate_positions:
+        wanted = [documents[i] for i in sorted(duplicate_positions)]
+        stored = {
+            (doc['user_id'], doc['idempotency_key']): doc
+            for doc in mood_questionnaire_collection.find({'$or': [
+                {'user_id': doc['user_id'], 'idempotency_key': doc['idempotency_key']} for doc in wanted
+            ]})
+        }
+        duplicates = [stored.get((doc['user_id'], doc['idempotency_key']), doc) for doc in wanted]
+        for doc in duplicates:
+            pending_since = doc.get('mood_pending_since')
+            if '_id' not in doc or pending_since is None or pending_since > now - PENDING_TIMEOUT:
+                continue
+            # Take over the update; the conditional filter lets only one concurrent retry win
+            claimed = mood_questionnaire_collection.update_one(
+                {'_id': doc['_id'], 'mood_pending_since': pending_since},
+                {'$set': {'mood_pending_since': now}}
+            )
+            if claimed.modified_count:
+                applied.append(doc)
+
+    applied_ids = [doc['_id'] for doc in applied]
+    try:
+        mood_storage.record([
+            # Convert to 1-5 scale
+            observation(doc['user_id'], doc['created_at'], doc['total_score'] / 10, 'questionnaire', [doc['mood']])
+            for doc in applied
+        ], now)
+    except Exception:
+        try:
+            # Expire the mark so an immediate retry applies the update instead of waiting PENDING_TIMEOUT
+            mood_questionnaire_collection.update_many(
+                {'_id': {'$in': applied_ids}}, {'$set': {'mood_pending_since': datetime.min}}
+            )
+        except Exception as e:
+            print(f"Error releasing pending questionnaires: {str(e)}")
+        raise
+    if applied_ids:
+        mood_questionnaire_collection.update_many(
+            {'_id': {'$in': applied_ids}}, {'$unset': {'mood_pending_since': ''}}
+        )
+
+    for doc in documents + duplicates:
+        doc.pop('mood_pending_since', None)
+    return created, duplicates, applied
@@ -0,0 +1,196 @@
+"""Opt-in sampling profiler for live requests.
+
+A profiled request has its thread's stack sampled every PROFILE_INTERVAL
+seconds by a background thread (sys._current_frames, so the request itself
+runs unmodified). The samples are written as a collapsed-stack file, which
+flamegraph.pl, speedscope or inferno render directly, next to a JSON file
+with the route, status and wall/CPU timings.
+
+    PROFILE_SAMPLE_RATE   share of requests to profile (default 0)
+    PROFILE_TOKEN         enables the X-Profile: <token> request header and
+                          the /api/admin/profiles endpoints (X-Profile-Token: <token>)
+    PROFILE_INTERVAL      seconds between samples (default 0.005)
+    PROFILE_DIR           where captures go (default ./profiles)
+    PROFILE_MAX_CAPTURES  older captures are deleted (default 200)
+
+With neither PROFILE_SAMPLE_RATE nor PROFILE_TOKEN set, `profiled` returns
+the view unchanged and no sampler thread is started.
+"""
+import functools
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import request
+
+
+class Capture:
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class SamplingProfiler:
+    def __init__(self, directory='./profiles', sample_rate=0.0, token=None, interval=0.005, max_captures=200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.interval = interval
+        self.max_captures = max_captures
+        self.enabled = sample_rate > 0 or bool(token)
+        self._captures = {}  # thread id -> Capture
+        self._labels = {}  # code object -> frame label
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._sampler = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            directory=os.getenv('PROFILE_DIR', './profiles'),
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+            token=os.getenv('PROFILE_TOKEN') or None,
+            interval=float(os.getenv('PROFILE_INTERVAL', 0.005)),
+            max_captures=int(os.getenv('PROFILE_MAX_CAPTURES', 200))
+        )
+
+    # --- Sampling ---
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = self._labels[code] = f"{module}:{code.co_name}".replace(';', ':').replace(' ', '_')
+        return label
+
+    def _sample(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for capture in self._captures.values():
+                    frame = frames.get(capture.thread_id)
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    if stack:
+                        capture.stacks[';'.join(reversed(stack))] += 1
+                        capture.samples += 1
+
+    def _start(self):
+        capture = Capture(threading.get_ident())
+        with self._lock:
+            self._captures[capture.thread_id] = capture
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='profiler-sampler', daemon=True)
+                self._sampler.start()
+            self._active.set()
+        return capture
+
+    def _stop(self, capture):
+        with self._lock:
+            self._captures.pop(capture.thread_id, None)
+            if not self._captures:
+                self._active.clear()
+
+    # --- Requests ---
+
+    def _token_matches(self, value):
+        # Bytes, since compare_digest raises TypeError on non-ASCII str
+        return hmac.compare_digest(value.encode('utf-8'), self.token.encode('utf-8'))
+
+    def _wanted(self):
+        if self.token and self._token_matches(request.headers.get('X-Profile', '')):
+            return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def profiled(self, view):
+        """Decorator profiling the requests selected by sample rate or debug header."""
+        if not self.enabled:
+            return view
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            reason = self._wanted()
+            if reason is None:
+                return view(*args, **kwargs)
+
+            capture = self._start()
+            started_at = datetime.now()
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            status = 500
+            try:
+                response = view(*args, **kwargs)
+                status = response[1] if isinstance(response, tuple) else getattr(response, 'status_code', 200)
+                return response
+            finally:
+                self._stop(capture)
+                try:
+                    self._save(capture, {
+                        'route': request.url_rule.rule if request.url_rule else request.path,
+                        'endpoint': request.endpoint,
+                        'method': request.method,
+                        'status': status,
+                        'reason': reason,
+                        'started_at': started_at.isoformat(),
+                        'wall_ms': round((time.perf_counter() - wall) * 1000, 1),
+                        'cpu_ms': round((time.thread_time() - cpu) * 1000, 1),
+                        'samples': capture.samples,
+                        'interval_ms': self.interval * 1000
+                    })
+                except Exception as e:
+                    print(f"Error saving profile: {str(e)}")
+        return wrapper
+
+    # --- Storage ---
+
+    def _save(self, capture, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{meta['endpoint']}_{int(meta['wall_ms'])}ms_{os.getpid()}"
+        meta['name'] = name
+        with open(os.path.join(self.directory, name + '.collapsed'), 'w') as f:
+            for stack, count in capture.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+            json.dump(meta, f)
+        self._prune()
+
+    def _prune(self):
+        metas = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in metas[:max(0, len(metas) - self.max_captures)]:
+            for suffix in ('.json', '.collapsed'):
+                path = os.path.join(self.directory, name[:-len('.json')] + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def authorized(self):
+        return bool(self.token) and self._token_matches(request.headers.get('X-Profile-Token', ''))
+
+    def list_captures(self):
+        if not os.path.isdir(self.directory):
+            return []
+        captures = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith('.json'):
+                with open(os.path.join(self.directory, name)) as f:
+                    captures.append(json.load(f))
+        return captures
+
+    def capture_path(self, name):
+        """Path of a capture's collapsed stacks, or None for unknown (or unsafe) names."""
+        if os.path.basename(name) != name:
+            return None
+        path = os.path.join(self.directory, name + '.collapsed')
+        return path if os.path.exists(path) else None
@@ -0,0 +1,142 @@
+"""HTTP response cache for the read-only, per-user mood endpoints.
+
+The React client polls the daily, report, questionnaire and calendar routes,
+and most polls see unchanged data. Every user has a version counter that the
+write paths (chat, questionnaire, report) bump. A cached entry holds the
+serialized JSON body and its strong ETag together with the version it was
+built from, so while the version is unchanged and the TTL has not expired a
+poll is answered from memory, or with a bodyless 304 when the client already
+has that ETag, without a Mongo query or a jsonify call.
+
+Cached entries are per process, the versions are a UserVersions, which
+with SERVING_MODE=worker lives in the model server so a write on one gunicorn
+worker invalidates the entries of all of them. Writes made outside the app
+(the bulk_reports.py job) are only picked up once the TTL expires, so keep
+RESPONSE_CACHE_TTL short.
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from flask import Response, request
+
+
+class UserVersions:
+    """Per-user write counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def get(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def count(self):
+        with self._lock:
+            return len(self._versions)
+
+
+class ResponseCache:
+    def __init__(self, ttl=30, max_entries=10000, versions=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.versions = versions or UserVersions()
+        self._entries = OrderedDict()  # key -> (version, expires_at, etag, body)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+
+    def bump(self, user_id):
+        """Invalidates every cached response of a user, call after each write."""
+        self.versions.bump(str(user_id))
+
+    def version(self, user_id):
+        return self.versions.get(str(user_id))
+
+    def _get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version or entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, version, etag, body):
+        # A write that landed while the response was built makes it stale already
+        if self.ttl <= 0 or self.version(key[0]) != version:
+            return
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        users = self.versions.count()
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'users': users,
+                'hits': self._hits,
+                'misses': self._misses,
+                'not_modified': self._not_modified,
+                'ttl': self.ttl
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _respond(self, etag, body):
+        if request.if_none_match.contains(etag):
+            self._count('_not_modified')
+            response = Response(status=304)
+        else:
+            response = Response(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+        # Clients may keep the body but must revalidate before reusing it
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def cached(self, view):
+        """Decorator for GET views whose first argument is the user id.
+
+        Only 200 JSON responses are cached. Today's date is part of the key
+        since the daily and current-month routes depend on it.
+        """
+        @functools.wraps(view)
+        def wrapper(user_id, *args, **kwargs):
+            user_id = str(user_id)
+            key = (user_id, request.full_path, date.today().toordinal())
+            version = self.version(user_id)
+
+            entry = self._get(key, version)
+            if entry is not None:
+                self._count('_hits')
+                return self._respond(entry[2], entry[3])
+
+            self._count('_misses')
+            response = view(user_id, *args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200 or not response.is_json:
+                return response
+            body = response.get_data()
+            etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+            self._put(key, version, etag, body)
+            return self._respond(etag, body)
+        return wrapper
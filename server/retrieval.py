@@ -0,0 +1,215 @@
+"""Retrieval stage used by the chat QA chain.
+
+The default `vector_db.as_retriever()` stuffs every chunk it finds into the
+prompt. This stage sits in front of the vector store and:
+
+- caches query -> chunk ids so recurring topics skip the vector search,
+- fetches a wider candidate set, drops candidates much less similar to the
+  query than the best one (`min_relevance`) and optionally reranks the rest
+  (lexical or MMR),
+- trims the context to at most `k` chunks within a token budget, which is
+  never larger than what the plain retriever would have sent,
+- keeps before/after context token counts so the saving can be measured.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Number of chunks the plain `as_retriever()` would have stuffed into the prompt
+DEFAULT_STUFF_K = 4
+
+RERANK_MODES = ('none', 'lexical', 'mmr')
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (words and punctuation), close enough for budgeting."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def normalize_query(query):
+    return ' '.join(_WORD_RE.findall(query.lower()))
+
+
+class ChromaChunkSource:
+    """Reads candidate chunks (id, text, metadata, embedding) from a Chroma store."""
+
+    def __init__(self, vector_db):
+        self.vector_db = vector_db
+
+    def search(self, query, fetch_k):
+        query_embedding = self.vector_db._embedding_function.embed_query(query)
+        result = self.vector_db._collection.query(
+            query_embeddings=[query_embedding],
+            n_results=fetch_k,
+            include=['documents', 'metadatas', 'embeddings']
+        )
+        candidates = [
+            {
+                'id': chunk_id,
+                'text': text,
+                'metadata': metadata or {},
+                'embedding': embedding
+            }
+            for chunk_id, text, metadata, embedding in zip(
+                result['ids'][0],
+                result['documents'][0],
+                result['metadatas'][0],
+                result['embeddings'][0]
+            )
+        ]
+        return query_embedding, candidates
+
+    def fetch(self, chunk_ids):
+        result = self.vector_db._collection.get(ids=list(chunk_ids), include=['documents', 'metadatas'])
+        return {
+            chunk_id: {'id': chunk_id, 'text': text, 'metadata': metadata or {}}
+            for chunk_id, text, metadata in zip(result['ids'], result['documents'], result['metadatas'])
+        }
+
+
+class RetrievalStage:
+    """Selects a small, relevant, token-bounded set of chunks for a query."""
+
+    def __init__(self, source, k=3, fetch_k=12, max_context_tokens=400, min_relevance=0.75,
+                 rerank='mmr', lambda_mult=0.5, cache_size=256):
+        if rerank not in RERANK_MODES:
+            raise ValueError(f"Unknown rerank mode '{rerank}', expected one of {RERANK_MODES}")
+        self.source = source
+        self.k = k
+        self.fetch_k = max(fetch_k, k)
+        self.max_context_tokens = max_context_tokens
+        self.min_relevance = min_relevance
+        self.rerank = rerank
+        self.lambda_mult = lambda_mult
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._query_cache = OrderedDict()  # normalized query -> (chunk ids, baseline tokens)
+        self._chunks = {}  # chunk id -> chunk dict, the corpus is small enough to keep
+        self._stats = {
+            'queries': 0,
+            'cache_hits': 0,
+            'baseline_context_tokens': 0,
+            'context_tokens': 0
+        }
+
+    def retrieve(self, query):
+        key = normalize_query(query)
+        with self._lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+
+        if cached is not None:
+            chunk_ids, baseline_tokens = cached
+            chunks = self._load_chunks(chunk_ids)
+            cache_hit = True
+        else:
+            query_embedding, candidates = self.source.search(query, self.fetch_k)
+            baseline_tokens = sum(estimate_tokens(c['text']) for c in candidates[:DEFAULT_STUFF_K])
+            relevant = self._relevant(query_embedding, candidates)
+            chunks = self._trim(self._rerank(query, query_embedding, relevant), baseline_tokens)
+            chunk_ids = tuple(c['id'] for c in chunks)
+            with self._lock:
+                for chunk in candidates:
+                    self._chunks[chunk['id']] = chunk
+                self._query_cache[key] = (chunk_ids, baseline_tokens)
+                if len(self._query_cache) > self.cache_size:
+                    self._query_cache.popitem(last=False)
+            cache_hit = False
+
+        context_tokens = sum(estimate_tokens(c['text']) for c in chunks)
+        with self._lock:
+            self._stats['queries'] += 1
+            self._stats['cache_hits'] += int(cache_hit)
+            self._stats['baseline_context_tokens'] += baseline_tokens
+            self._stats['context_tokens'] += context_tokens
+        print(f"Retrieval: {len(chunks)} chunks, context tokens {baseline_tokens} -> {context_tokens}"
+              f"{' (cached)' if cache_hit else ''}")
+
+        return [Document(page_content=c['text'], metadata=c['metadata']) for c in chunks]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_queries'] = len(self._query_cache)
+        queries = stats['queries']
+        stats['avg_baseline_context_tokens'] = round(stats['baseline_context_tokens'] / queries, 1) if queries else 0
+        stats['avg_context_tokens'] = round(stats['context_tokens'] / queries, 1) if queries else 0
+        stats['token_saving_percentage'] = round(
+            100 * (1 - stats['context_tokens'] / stats['baseline_context_tokens']), 1
+        ) if stats['baseline_context_tokens'] else 0
+        return stats
+
+    def clear_cache(self):
+        with self._lock:
+            self._query_cache.clear()
+
+    def _relevant(self, query_embedding, candidates):
+        """Candidates whose cosine similarity is at least min_relevance x the best one's."""
+        if not candidates or self.min_relevance <= 0:
+            return candidates
+        query = np.asarray(query_embedding, dtype=np.float32)
+        embeddings = np.array([c['embedding'] for c in candidates], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+        similarity = (embeddings @ query) / np.where(norms > 0, norms, 1)
+        cutoff = self.min_relevance * similarity.max()
+        return [chunk for chunk, score in zip(candidates, similarity) if score >= cutoff]
+
+    def _rerank(self, query, query_embedding, candidates):
+        if not candidates or self.rerank == 'none':
+            return candidates
+        if self.rerank == 'mmr':
+            order = maximal_marginal_relevance(
+                np.array(query_embedding, dtype=np.float32),
+                [c['embedding'] for c in candidates],
+                k=len(candidates),
+                lambda_mult=self.lambda_mult
+            )
+            return [candidates[i] for i in order]
+
+        # Lexical: share of query words found in the chunk, vector rank breaks ties
+        query_words = set(_WORD_RE.findall(query.lower()))
+        if not query_words:
+            return candidates
+
+        def score(item):
+            rank, chunk = item
+            overlap = len(query_words & set(_WORD_RE.findall(chunk['text'].lower()))) / len(query_words)
+            return overlap + 0.5 * (1 - rank / len(candidates))
+
+        return [chunk for _, chunk in sorted(enumerate(candidates), key=score, reverse=True)]
+
+    def _trim(self, chunks, baseline_tokens):
+        # Reranking may prefer longer chunks, so the budget is capped by the plain retriever's context
+        budget = min(self.max_context_tokens, baseline_tokens)
+        selected = []
+        total = 0
+        for chunk in chunks:
+            if len(selected) >= self.k:
+                break
+            tokens = estimate_tokens(chunk['text'])
+            # Always keep the best chunk, even if it alone exceeds the budget
+            if selected and total + tokens > budget:
+                continue
+            selected.append(chunk)
+            total += tokens
+        return selected
+
+    def _load_chunks(self, chunk_ids):
+        with self._lock:
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in self._chunks]
+        if missing:
+            fetched = self.source.fetch(missing)
+            with self._lock:
+                self._chunks.update(fetched)
+        with self._lock:
+            return [self._chunks[chunk_id] for chunk_id in chunk_ids if chunk_id in self._chunks]
+
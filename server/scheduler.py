@@ -0,0 +1,268 @@
+"""In-process scheduler for the expensive endpoints.
+
+`/api/chat` (LLM + embeddings) and `/api/chat/report` (full-history scan +
+upserts) run on their own bounded queue and worker pool per endpoint class,
+so a burst of reports can't hold up interactive chat and cheap endpoints keep
+running on the request threads:
+
+- classes have a priority, and a worker only starts a job when no class with
+  a higher priority has a backlog (chat > report),
+- each user may only have `per_user` jobs queued or running per class, more
+  are rejected with 429,
+- a full queue, or a job that waited longer than `max_wait`, is shed with 503.
+
+Both rejections carry a Retry-After estimated from the recent service time.
+Queue depth, wait and run times are reported by `stats()`.
+
+Queues and pools are per process, the per-user counts are a UserSlots, which
+with SERVING_MODE=worker lives in the model server so the limit holds across
+gunicorn workers. A slot not released within SCHEDULER_SLOT_LEASE seconds
+(its worker died) expires.
+
+    SCHEDULER=off                       run the views directly
+    SCHEDULER_<CLASS>_WORKERS           worker threads (chat 4, report 2)
+    SCHEDULER_<CLASS>_QUEUE             queued jobs before shedding (chat 32, report 8)
+    SCHEDULER_<CLASS>_PER_USER          jobs per user (chat 2, report 1)
+    SCHEDULER_<CLASS>_MAX_WAIT          seconds a job may wait (chat 30, report 60)
+    SCHEDULER_SLOT_LEASE                seconds before a per-user slot expires (600)
+"""
+import functools
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from flask import copy_current_request_context, jsonify
+
+
+class Rejected(Exception):
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class UserSlots:
+    """Jobs queued or running per (class, user), each held for at most `lease` seconds."""
+
+    def __init__(self, lease=600):
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._slots = {}  # (class name, user) -> acquire times
+
+    @classmethod
+    def from_env(cls):
+        return cls(lease=float(os.getenv('SCHEDULER_SLOT_LEASE', 600)))
+
+    def acquire(self, class_name, user, limit):
+        key = (class_name, user)
+        now = time.monotonic()
+        with self._lock:
+            held = [t for t in self._slots.get(key, []) if now - t < self.lease]
+            if len(held) >= limit:
+                self._slots[key] = held
+                return False
+            held.append(now)
+            self._slots[key] = held
+            return True
+
+    def release(self, class_name, user):
+        key = (class_name, user)
+        with self._lock:
+            held = self._slots.get(key)
+            if held:
+                held.pop(0)
+            if not held:
+                self._slots.pop(key, None)
+
+    def active_users(self, class_name):
+        with self._lock:
+            return sum(1 for name, _ in self._slots if name == class_name)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 1)
+
+
+class WorkClass:
+    """Queue, worker threads and counters of one endpoint class."""
+
+    def __init__(self, name, priority, workers, queue_size, per_user, max_wait):
+        self.name = name
+        self.priority = priority
+        self.workers = workers
+        self.queue_size = queue_size
+        self.per_user = per_user
+        self.max_wait = max_wait
+        self.queue = deque()  # (enqueued_at, user, fn, future)
+        self.running = 0
+        self.waits = deque(maxlen=1000)
+        self.runs = deque(maxlen=1000)
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0,
+                         'rejected_queue_full': 0, 'rejected_user_limit': 0, 'shed_max_wait': 0}
+        self.max_depth = 0
+        self.threads = []
+
+    @classmethod
+    def from_env(cls, name, priority, workers, queue_size, per_user, max_wait):
+        prefix = f"SCHEDULER_{name.upper()}_"
+        return cls(
+            name, priority,
+            workers=int(os.getenv(prefix + 'WORKERS', workers)),
+            queue_size=int(os.getenv(prefix + 'QUEUE', queue_size)),
+            per_user=int(os.getenv(prefix + 'PER_USER', per_user)),
+            max_wait=float(os.getenv(prefix + 'MAX_WAIT', max_wait))
+        )
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        recent = list(self.runs)[-50:]
+        service = sum(recent) / len(recent) if recent else 1.0
+        return max(1, math.ceil(service * (len(self.queue) + self.running) / max(self.workers, 1)))
+
+    def stats(self, active_users):
+        return {
+            'priority': self.priority,
+            'workers': self.workers,
+            'running': self.running,
+            'queue_depth': len(self.queue),
+            'queue_size': self.queue_size,
+            'max_queue_depth': self.max_depth,
+            'per_user': self.per_user,
+            'active_users': active_users,
+            'wait_ms_p50': _percentile(self.waits, 50),
+            'wait_ms_p95': _percentile(self.waits, 95),
+            'run_ms_p50': _percentile(self.runs, 50),
+            'run_ms_p95': _percentile(self.runs, 95),
+            **self.counters
+        }
+
+
+class Scheduler:
+    def __init__(self, classes, enabled=True, slots=None):
+        self.classes = {work_class.name: work_class for work_class in classes}
+        self.enabled = enabled
+        self.slots = slots or UserSlots.from_env()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, slots=None):
+        return cls([
+            WorkClass.from_env('chat', priority=0, workers=4, queue_size=32, per_user=2, max_wait=30),
+            WorkClass.from_env('report', priority=1, workers=2, queue_size=8, per_user=1, max_wait=60)
+        ], enabled=os.getenv('SCHEDULER', 'on') != 'off', slots=slots)
+
+    def submit(self, class_name, user, fn):
+        """Queues fn() and returns a Future; raises Rejected when the class is full."""
+        work_class = self.classes[class_name]
+        future = Future()
+        # Taken outside the lock, the slots may be a model server round trip away
+        if not self.slots.acquire(class_name, user, work_class.per_user):
+            with self._cond:
+                work_class.counters['rejected_user_limit'] += 1
+                retry_after = work_class.retry_after()
+            raise Rejected(429, 'Too many requests in progress for this user', retry_after)
+        with self._cond:
+            self._start_workers(work_class)
+            full = len(work_class.queue) >= work_class.queue_size
+            if full:
+                work_class.counters['rejected_queue_full'] += 1
+                retry_after = work_class.retry_after()
+            else:
+                work_class.queue.append((time.monotonic(), user, fn, future))
+                work_class.counters['submitted'] += 1
+                work_class.max_depth = max(work_class.max_depth, len(work_class.queue))
+                self._cond.notify_all()
+        if full:
+            self.slots.release(class_name, user)
+            raise Rejected(503, 'Server is busy, please retry shortly', retry_after)
+        return future
+
+    def _start_workers(self, work_class):
+        # Started on first use, so gunicorn workers forked from a preloaded app get their own threads
+        while len(work_class.threads) < work_class.workers:
+            thread = threading.Thread(
+                target=self._work, args=(work_class,),
+                name=f"scheduler-{work_class.name}-{len(work_class.threads)}", daemon=True
+            )
+            work_class.threads.append(thread)
+            thread.start()
+
+    def _runnable(self, work_class):
+        if not work_class.queue:
+            return False
+        # A backlog in a higher priority class means it is saturated, so leave it the CPU
+        return not any(
+            other.queue for other in self.classes.values() if other.priority < work_class.priority
+        )
+
+    def _work(self, work_class):
+        while True:
+            with self._cond:
+                while not self._runnable(work_class):
+                    self._cond.wait()
+                enqueued_at, user, fn, future = work_class.queue.popleft()
+                waited = time.monotonic() - enqueued_at
+                work_class.waits.append(waited)
+                shed = waited > work_class.max_wait
+                if shed:
+                    work_class.counters['shed_max_wait'] += 1
+                else:
+                    work_class.running += 1
+                self._cond.notify_all()
+
+            started = time.monotonic()
+            result, error = None, None
+            if shed:
+                error = Rejected(503, 'Server is busy, please retry shortly', work_class.retry_after())
+            elif future.set_running_or_notify_cancel():
+                try:
+                    result = fn()
+                except BaseException as e:
+                    error = e
+            # Freed before the caller sees the result, so its next request finds the slot free
+            self.slots.release(work_class.name, user)
+            if not future.done():
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+            with self._cond:
+                if not shed:
+                    work_class.running -= 1
+                    work_class.runs.append(time.monotonic() - started)
+                    work_class.counters['failed' if error else 'completed'] += 1
+                self._cond.notify_all()
+
+    def scheduled(self, class_name, user):
+        """Decorator running a Flask view on `class_name`'s pool; `user()` names the requesting user."""
+        def decorator(view):
+            if not self.enabled:
+                return view
+
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                run = copy_current_request_context(lambda: view(*args, **kwargs))
+                try:
+                    return self.submit(class_name, str(user()), run).result()
+                except Rejected as e:
+                    response = jsonify({'error': str(e)})
+                    response.status_code = e.status
+                    response.headers['Retry-After'] = str(e.retry_after)
+                    return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        active_users = {name: self.slots.active_users(name) for name in self.classes}
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'classes': {name: work_class.stats(active_users[name]) for name, work_class in self.classes.items()}
+            }
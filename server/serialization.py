@@ -0,0 +1,49 @@
+"""JSON responses for Mongo documents.
+
+Documents can be returned as they come out of PyMongo: ObjectId becomes its
+hex string and datetimes become ISO 8601 strings (the same text `.isoformat()`
+produced before), so the routes no longer copy and mutate every document.
+orjson is used when installed, with the stdlib encoder as the fallback.
+Keys are sorted like Flask's jsonify.
+"""
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder produces the same JSON, only slower
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+def bson_default(obj):
+    """Encodes the BSON and NumPy values the JSON encoders don't know natively."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()  # only reached with the stdlib encoder
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if hasattr(obj, 'tolist'):  # NumPy scalars and arrays
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_stdlib(obj):
+    return json.dumps(obj, default=bson_default, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj):
+    """Serializes to UTF-8 JSON bytes."""
+    if orjson:
+        return orjson.dumps(obj, default=bson_default, option=ORJSON_OPTIONS)
+    return dumps_stdlib(obj)
+
+
+def json_response(obj, status=200):
+    return Response(dumps(obj), status=status, mimetype='application/json')
@@ -0,0 +1,234 @@
+"""Server-side mood trend analytics.
+
+Each user's history is kept as date-indexed NumPy arrays (one slot per
+calendar day since their first tracked day) holding the score sum and count.
+Prefix sums over those arrays are cached and only recomputed from the first
+day that changed, which for live traffic is the last day, so rolling means,
+volatility, EMA and streak queries cost O(window) instead of a rescan of the
+raw history.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+POSITIVE_THRESHOLD = 3  # same cut-off as the mood distributions: > 3 is positive
+
+
+def _window(prefix, end, window):
+    """Sum of the underlying values over `window` days ending at each index in `end`."""
+    n = len(prefix) - 1
+    hi = np.clip(end + 1, 0, n)
+    lo = np.clip(end + 1 - window, 0, n)
+    return prefix[hi] - prefix[lo]
+
+
+def _run_lengths(mask):
+    """Length of the run of True values ending at each index."""
+    runs = np.zeros(len(mask), dtype=np.int64)
+    if not len(mask):
+        return runs
+    idx = np.arange(1, len(mask) + 1)
+    last_false = np.maximum.accumulate(np.where(mask, 0, idx))
+    runs[:] = np.where(mask, idx - last_false, 0)
+    return runs
+
+
+class UserTrend:
+    """Per-day aggregates for one user with lazily maintained prefix sums."""
+
+    def __init__(self, start_ordinal, capacity=64):
+        self.start = start_ordinal
+        self.length = 0
+        self.sums = np.zeros(capacity, dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.ema_span = None
+        self._dirty_from = 0
+        self._cache = {}
+        self._ema = np.zeros(0)
+        self.loaded_at = time.monotonic()
+
+    def add(self, day_ordinal, total, count=1):
+        if day_ordinal < self.start:
+            shift = self.start - day_ordinal
+            self._grow(self.length + shift)
+            self.sums[shift:shift + self.length] = self.sums[:self.length].copy()
+            self.counts[shift:shift + self.length] = self.counts[:self.length].copy()
+            self.sums[:shift] = 0
+            self.counts[:shift] = 0
+            self.start = day_ordinal
+            self.length += shift
+            self._dirty_from = 0
+        idx = day_ordinal - self.start
+        if idx >= self.length:
+            self._grow(idx + 1)
+            self.length = idx + 1
+        self.sums[idx] += total
+        self.counts[idx] += count
+        self._dirty_from = min(self._dirty_from, idx)
+
+    def _grow(self, size):
+        if size <= len(self.sums):
+            return
+        capacity = max(size, 2 * len(self.sums))
+        self.sums = np.concatenate([self.sums, np.zeros(capacity - len(self.sums))])
+        self.counts = np.concatenate([self.counts, np.zeros(capacity - len(self.counts), dtype=np.int64)])
+
+    def _refresh(self, ema_span):
+        n = self.length
+        if self._dirty_from >= n and self.ema_span == ema_span and self._cache:
+            return
+        sums = self.sums[:n]
+        counts = self.counts[:n]
+        logged = counts > 0
+        averages = np.divide(sums, counts, out=np.zeros(n), where=logged)
+
+        start = 0 if self.ema_span != ema_span else min(self._dirty_from, n)
+        for key, values in (
+            ('sum', sums),
+            ('count', counts),
+            ('avg', averages),
+            ('avg_sq', averages ** 2),
+            ('logged', logged.astype(np.int64))
+        ):
+            prefix = self._cache.get(key)
+            if prefix is None or start == 0:
+                prefix = np.zeros(n + 1, dtype=np.float64)
+                prefix[1:] = np.cumsum(values)
+            else:
+                prefix = np.concatenate([prefix[:start + 1], np.zeros(n - start)])
+                prefix[start + 1:] = prefix[start] + np.cumsum(values[start:])
+            self._cache[key] = prefix
+
+        # EMA over logged days, carried forward across days without data
+        alpha = 2.0 / (ema_span + 1)
+        ema = np.concatenate([self._ema[:start], np.zeros(n - start)])
+        previous = ema[start - 1] if start > 0 else np.nan
+        for i in range(start, n):
+            if logged[i]:
+                previous = averages[i] if np.isnan(previous) else alpha * averages[i] + (1 - alpha) * previous
+            ema[i] = previous
+        self._ema = ema
+
+        self._cache['logged_runs'] = _run_lengths(logged)
+        self._cache['positive_runs'] = _run_lengths(logged & (averages > POSITIVE_THRESHOLD))
+        self.ema_span = ema_span
+        self._dirty_from = n
+
+    def query(self, end_ordinal, days, windows=(7, 30), ema_span=7):
+        self._refresh(ema_span)
+        n = self.length
+        end = np.arange(end_ordinal - days + 1, end_ordinal + 1) - self.start
+        p = self._cache
+
+        day_count = _window(p['count'], end, 1)
+        daily = np.divide(_window(p['sum'], end, 1), day_count, out=np.full(days, np.nan), where=day_count > 0)
+        # Clipping to the last tracked day carries the EMA forward past it
+        ema = np.where(end < 0, np.nan, self._ema[np.clip(end, 0, n - 1)]) if n else np.full(days, np.nan)
+
+        series = {'average': daily, 'count': day_count, 'ema': ema}
+        latest = {}
+        for window in windows:
+            count = _window(p['count'], end, window)
+            series[f'rolling_{window}'] = np.divide(
+                _window(p['sum'], end, window), count, out=np.full(days, np.nan), where=count > 0
+            )
+            logged_days = _window(p['logged'], end[-1:], window)[0]
+            if logged_days >= 2:
+                mean = _window(p['avg'], end[-1:], window)[0] / logged_days
+                mean_sq = _window(p['avg_sq'], end[-1:], window)[0] / logged_days
+                latest[f'volatility_{window}'] = round(float(np.sqrt(max(mean_sq - mean ** 2, 0.0))), 3)
+            else:
+                latest[f'volatility_{window}'] = None
+            latest[f'rolling_{window}'] = _round(series[f'rolling_{window}'][-1])
+
+        last = int(end[-1])
+        if 0 <= last < n:
+            streak_day = last
+        elif n and last == n:
+            # Nothing logged yet today: yesterday's streak is still alive
+            streak_day = n - 1
+        else:
+            streak_day = None
+        latest['streaks'] = {
+            'current_logging': int(p['logged_runs'][streak_day]) if streak_day is not None else 0,
+            'longest_logging': int(p['logged_runs'].max()) if n else 0,
+            'current_positive': int(p['positive_runs'][streak_day]) if streak_day is not None else 0,
+            'longest_positive': int(p['positive_runs'].max()) if n else 0
+        }
+        return series, latest
+
+
+def _round(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+class TrendStore:
+    """LRU cache of UserTrend objects loaded from the mood storage on first use."""
+
+    def __init__(self, mood_storage, max_users=5000, ttl=300):
+        self.mood_storage = mood_storage
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def _load(self, user_id):
+        trend = None
+        for day, total, count in self.mood_storage.daily_scores(user_id):
+            day = date.fromisoformat(day).toordinal()
+            if trend is None:
+                trend = UserTrend(day)
+            trend.add(day, total, count)
+        return trend or UserTrend(date.today().toordinal())
+
+    def _get(self, user_id):
+        with self._lock:
+            trend = self._users.get(user_id)
+            if trend is not None and time.monotonic() - trend.loaded_at < self.ttl:
+                self._users.move_to_end(user_id)
+                return trend
+        # Other workers write too, so entries are reloaded after `ttl` seconds
+        trend = self._load(user_id)
+        with self._lock:
+            self._users[user_id] = trend
+            self._users.move_to_end(user_id)
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return trend
+
+    def record(self, user_id, day, score):
+        """Applies a new observation to a cached user; uncached users load it from Mongo later."""
+        with self._lock:
+            trend = self._users.get(user_id)
+            if trend is not None:
+                trend.add(date.fromisoformat(day).toordinal(), score)
+
+    def trends(self, user_id, days=30, ema_span=7, today=None):
+        today = today or date.today()
+        trend = self._get(user_id)
+        with self._lock:
+            series, latest = trend.query(today.toordinal(), days, ema_span=ema_span)
+
+        first_day = today - timedelta(days=days - 1)
+        daily = [
+            {
+                'date': (first_day + timedelta(days=i)).isoformat(),
+                'average': _round(series['average'][i]),
+                'count': int(series['count'][i]),
+                'rolling_7': _round(series['rolling_7'][i]),
+                'rolling_30': _round(series['rolling_30'][i]),
+                'ema': _round(series['ema'][i])
+            }
+            for i in range(days)
+        ]
+        return {
+            'user_id': user_id,
+            'start_date': first_day.isoformat(),
+            'end_date': today.isoformat(),
+            'ema_span': ema_span,
+            'daily': daily,
+            **latest
+        }